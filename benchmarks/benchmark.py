@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the harmonization pipeline on a synthetic ontology and data file.
+
+Times each stage separately and prints the results as JSON, to compare throughput across commits:
+
+    python benchmarks/benchmark.py --rows 100000 --classes 20000 --output bench.json
+"""
+
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from data_io import OUTPUT_FORMATS, open_chunk_writer  # noqa: E402
+from closure import AncestorClosure  # noqa: E402
+from harmonize import (DICTIONARY_COLUMNS, MATCH_TIERS, combine_results, open_readonly_adapter,  # noqa: E402
+                       roll_up_results, search_ontology)
+from lexicon import Lexicon  # noqa: E402
+from synthetic import make_data, make_ontology_db  # noqa: E402
+
+
+def _peak_rss_mb() -> float:
+    """
+    :returns: The peak resident set size of this process so far, in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def _time_stage(stages: dict, name: str, rows: int, func):
+    """
+    Run one stage and record its duration, throughput and the peak RSS after it.
+    :returns: The result of the stage.
+    """
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    stages[name] = {
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+    }
+    return result
+
+
+@click.command()
+@click.option('--rows', type=click.IntRange(min=1), default=100000, show_default=True, help='Rows of the data file')
+@click.option('--classes', type=click.IntRange(min=1), default=20000, show_default=True, help='Classes of the ontology')
+@click.option('--repetition-rate', type=click.FloatRange(0, 1), default=0.5, show_default=True,
+              help='Fraction of rows repeating an earlier term')
+@click.option('--typo-rate', type=click.FloatRange(0, 1), default=0.05, show_default=True,
+              help='Fraction of terms with one typo')
+@click.option('--miss-rate', type=click.FloatRange(0, 1), default=0.1, show_default=True,
+              help='Fraction of terms not in the ontology')
+@click.option('--engine', type=click.Choice(['lexicon', 'oak']), default='lexicon', show_default=True)
+@click.option('--tiers', default='EXACT_LABEL,EXACT_ALIAS', show_default=True, help='Match tiers separated by commas')
+@click.option('--roll-up-classes', type=click.IntRange(min=0), default=0, show_default=True,
+              help='Roll the matched terms up to this many grouping classes, the classes nearest the root, 0 to not roll up')
+@click.option('--output-format', type=click.Choice(list(OUTPUT_FORMATS)), default='xlsx', show_default=True)
+@click.option('--ontology-id', default='mondo', show_default=True,
+              help='Ontology ID of the synthetic ontology, one with result columns in the output')
+@click.option('--seed', type=int, default=0, show_default=True)
+@click.option('--work-dir', type=click.Path(path_type=Path), default=None,
+              help='Directory for the generated files, a temporary directory if not given')
+@click.option('--output', '-o', type=click.Path(path_type=Path), default=None, help='Also write the JSON results to this file')
+def benchmark(rows: int, classes: int, repetition_rate: float, typo_rate: float, miss_rate: float, engine: str, tiers: str,
+              roll_up_classes: int, output_format: str, ontology_id: str, seed: int, work_dir: Path, output: Path):
+    """
+    Generate a synthetic ontology and data file, then time opening the ontology, search_ontology,
+    the optional roll-up, combine_results and writing the output file.
+    """
+    tiers = [tier.strip().upper() for tier in tiers.split(',')]
+    unknown_tiers = [tier for tier in tiers if tier not in MATCH_TIERS]
+    if unknown_tiers:
+        raise click.BadParameter(f"Unknown match tiers {', '.join(unknown_tiers)}", param_hint='--tiers')
+
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        work_dir = Path(work_dir or temporary_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        db_path = work_dir / f'{ontology_id}.db'
+
+        # Inputs, not part of the measured stages
+        terms = make_ontology_db(db_path, ontology_id, classes, seed=seed)
+        data_df = make_data(terms, rows, repetition_rate, typo_rate, miss_rate, seed=seed)
+        data_df['UUID'] = [str(uuid.uuid4()) for _ in range(len(data_df))]
+
+        stages = {}
+        if engine == 'lexicon':
+            lexicon = _time_stage(stages, 'open_ontology', rows, lambda: Lexicon.from_semsql(ontology_id, str(db_path)))
+            adapter = None
+        else:
+            lexicon = None
+            adapter = _time_stage(stages, 'open_ontology', rows, lambda: open_readonly_adapter(str(db_path)))
+
+        search_results_df = _time_stage(stages, 'search_ontology', rows,
+                                        lambda: search_ontology(ontology_id, adapter, data_df, tiers, lexicon))
+        if roll_up_classes:
+            closure = _time_stage(stages, 'open_closure', rows, lambda: AncestorClosure.from_semsql(str(db_path)))
+            # Parents are numbered before their children, so the first classes are nearest the root
+            groups = {curie: None for curie in closure.curies[:roll_up_classes]}
+            search_results_df = _time_stage(stages, 'roll_up', rows,
+                                            lambda: roll_up_results(ontology_id, search_results_df, closure, groups))
+        combined_df = _time_stage(stages, 'combine_results', rows,
+                                  lambda: combine_results(data_df, {ontology_id: search_results_df}))
+
+        output_path = work_dir / f'output.{output_format}'
+
+        def write_output():
+            writer = open_chunk_writer(output_path, DICTIONARY_COLUMNS)
+            writer.write(combined_df)
+            writer.close()
+
+        _time_stage(stages, 'write_output', rows, write_output)
+
+    total_seconds = sum(stage['seconds'] for stage in stages.values())
+    results = {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'parameters': {
+            'rows': rows, 'classes': classes, 'repetition_rate': repetition_rate, 'typo_rate': typo_rate,
+            'miss_rate': miss_rate, 'engine': engine, 'tiers': tiers, 'roll_up_classes': roll_up_classes,
+            'output_format': output_format, 'seed': seed,
+        },
+        'distinct_terms': int(data_df['source_column_value'].str.strip().str.lower().nunique()),
+        'matched_rows': int(len(search_results_df)),
+        'stages': stages,
+        'total': {
+            'seconds': round(total_seconds, 4),
+            'rows_per_sec': round(rows / total_seconds, 1) if total_seconds > 0 else None,
+            'peak_rss_mb': round(_peak_rss_mb(), 1),
+        },
+    }
+    report = json.dumps(results, indent=2)
+    click.echo(report)
+    if output is not None:
+        output.write_text(report + '\n')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Check that streaming mode gives every row the same ID as a whole-file run, identical rows in different chunks
+included, for CSV and Excel data files, so that a streamed output can be used as the previous output of an
+incremental run:
+
+    python benchmarks/row_ids.py --rows 5000 --stream-rows 300
+"""
+
+import json
+import random
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from data_io import iter_input_chunks, open_chunk_writer, read_input  # noqa: E402
+from incremental import PreviousRun, row_ids, write_manifest  # noqa: E402
+from synthetic import make_data, make_ontology_db  # noqa: E402
+
+
+def compare_row_ids(data_path: Path, stream_rows: int, work_dir: Path) -> dict:
+    """
+    Compare the row IDs of a data file read whole and in chunks, and write the chunks with their IDs like
+    streaming mode does to read them back as a previous output.
+    :returns: The numbers of duplicate and differing IDs, and of rows reusable from the streamed output.
+    """
+    whole_ids = row_ids(read_input(data_path)).tolist()
+
+    output_path = work_dir / f'{data_path.stem}-output.xlsx'
+    writer = open_chunk_writer(output_path)
+    seen = Counter()
+    for chunk_df in iter_input_chunks(data_path, stream_rows):
+        chunk_df['UUID'] = row_ids(chunk_df, seen)
+        writer.write(chunk_df)
+    writer.close()
+    write_manifest(output_path, {}, {})
+    streamed_ids = read_input(output_path)['UUID'].tolist()
+    previous_ids = PreviousRun(output_path).row_ids
+
+    return {
+        'duplicate_streamed_ids': len(streamed_ids) - len(set(streamed_ids)),
+        'ids_differing_from_whole_file': sum(a != b for a, b in zip(whole_ids, streamed_ids)) + abs(len(whole_ids) - len(streamed_ids)),
+        'rows_reusable_as_previous_output': len(previous_ids & set(whole_ids)),
+    }
+
+
+@click.command()
+@click.option('--rows', type=click.IntRange(min=1), default=5000, show_default=True, help='Rows of the data file')
+@click.option('--stream-rows', type=click.IntRange(min=1), default=300, show_default=True, help='Rows per chunk')
+@click.option('--repetition-rate', type=click.FloatRange(0, 1), default=0.9, show_default=True,
+              help='Fraction of rows repeating a term of an earlier row')
+@click.option('--seed', type=int, default=0, show_default=True)
+def check_row_ids(rows: int, stream_rows: int, repetition_rate: float, seed: int):
+    """
+    Compare the row IDs of CSV and Excel data files read whole and in chunks, exiting with status 1 when they differ
+    or when the streamed output is not usable as a previous output.
+    """
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        work_dir = Path(temporary_dir)
+        terms = make_ontology_db(work_dir / 'bench.db', classes=200, seed=seed)
+        data_df = make_data(terms, rows, repetition_rate, seed=seed)
+        # Numeric study IDs, empty in the first rows only, so that the whole column is read as floats but the
+        # chunks without an empty cell as integers
+        rng = random.Random(seed)
+        data_df['study'] = [None if number < 10 else rng.randint(1, 50) for number in range(rows)]
+        data_df['study'] = data_df['study'].astype('Int64')
+
+        report = {'rows': rows, 'stream_rows': stream_rows}
+        for suffix in ('.csv', '.xlsx'):
+            data_path = work_dir / f'data{suffix}'
+            if suffix == '.csv':
+                data_df.to_csv(data_path, index=False)
+            else:
+                data_df.to_excel(data_path, sheet_name='Sheet1', index=False)
+            report[suffix.lstrip('.')] = compare_row_ids(data_path, stream_rows, work_dir)
+
+    click.echo(json.dumps(report, indent=2))
+    failed = [fmt for fmt, result in report.items() if isinstance(result, dict) and (
+        result['duplicate_streamed_ids'] or result['ids_differing_from_whole_file'] or
+        result['rows_reusable_as_previous_output'] != rows)]
+    if failed:
+        click.echo(f"Streamed row IDs differ from those of the whole data file for {', '.join(failed)}", err=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    check_row_ids()
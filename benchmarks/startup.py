@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Startup time budget of the harmonize CLI, which workflows call thousands of times.
+
+Runs a command that does no work with `python -X importtime`, and fails when it imports a module that is only
+needed to search, or when the imports or the whole process take longer than the budget:
+
+    python benchmarks/startup.py --budget-ms 150
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import click
+
+HARMONIZE = Path(__file__).resolve().parent.parent / 'src' / 'harmonize.py'
+
+# Modules that take seconds to import and must only be loaded by the commands that search
+HEAVY_MODULES = ('oaklib', 'pandas', 'numpy', 'tqdm', 'sqlalchemy', 'pyarrow', 'openpyxl')
+
+# Budgets of the imports of the CLI, and of the whole process including interpreter startup
+IMPORT_BUDGET_MS = 150
+WALL_BUDGET_MS = 1000
+
+
+def _import_times(args: list) -> dict:
+    """
+    :param args: Arguments of the Python interpreter, e.g. a script and its arguments.
+    :returns: Dict of top-level module to its cumulative import time in microseconds, in import order.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', *args], capture_output=True, text=True, check=True)
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented further, their time is part of the cumulative time of the top-level module
+        if not name.startswith('  '):
+            import_times[name.strip()] = int(cumulative)
+    return import_times
+
+
+def measure_imports(args: list) -> Tuple[Dict[str, int], List[str]]:
+    """
+    :param args: Arguments of harmonize.py, e.g. ['--help'].
+    :returns: Dict of top-level module imported by the CLI, not by the interpreter itself, to its cumulative import
+        time in microseconds, and the heavy modules imported.
+    """
+    import_times = _import_times([str(HARMONIZE), *args])
+    # Modules imported by the interpreter itself before running the script, like site, are not part of the CLI
+    interpreter_modules = set(_import_times(['-c', 'pass']))
+    cli_times = {name: us for name, us in import_times.items() if name not in interpreter_modules}
+    heavy = sorted({name.split('.')[0] for name in import_times} & set(HEAVY_MODULES))
+    return cli_times, heavy
+
+
+def _wall_ms(args: list, runs: int) -> float:
+    """
+    :returns: The median wall time of running the command, in milliseconds.
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(HARMONIZE), *args], capture_output=True, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+@click.command()
+@click.option('--budget-ms', type=float, default=IMPORT_BUDGET_MS, show_default=True,
+              help='Maximum import time of the harmonize module and its dependencies, excluding interpreter startup')
+@click.option('--wall-budget-ms', type=float, default=WALL_BUDGET_MS, show_default=True,
+              help='Maximum median wall time of the whole process, including interpreter startup')
+@click.option('--runs', type=click.IntRange(min=1), default=5, show_default=True, help='Runs to take the median wall time of')
+@click.option('--command', 'command', default='--help', show_default=True, help='Arguments of harmonize.py to time')
+def startup(budget_ms: float, wall_budget_ms: float, runs: int, command: str):
+    """
+    Check the startup time of the harmonize CLI against a budget, exiting with status 1 when it is exceeded.
+    """
+    args = command.split()
+    cli_times, heavy = measure_imports(args)
+    import_ms = sum(cli_times.values()) / 1000
+    wall_ms = _wall_ms(args, runs)
+
+    report = {
+        'command': f'harmonize.py {command}',
+        'import_ms': round(import_ms, 1),
+        'budget_ms': budget_ms,
+        'wall_ms': round(wall_ms, 1),
+        'wall_budget_ms': wall_budget_ms,
+        'heavy_modules_imported': heavy,
+        'slowest_imports_ms': {name: round(us / 1000, 1)
+                               for name, us in sorted(cli_times.items(), key=lambda item: -item[1])[:10]},
+    }
+    click.echo(json.dumps(report, indent=2))
+
+    failures = []
+    if heavy:
+        failures.append(f"imports {', '.join(heavy)}")
+    if import_ms > budget_ms:
+        failures.append(f"imports take {import_ms:.0f} ms, over the budget of {budget_ms:.0f} ms")
+    if wall_ms > wall_budget_ms:
+        failures.append(f"takes {wall_ms:.0f} ms, over the budget of {wall_budget_ms:.0f} ms")
+    if failures:
+        click.echo(f"Startup budget exceeded: harmonize.py {command} {'; '.join(failures)}", err=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    startup()
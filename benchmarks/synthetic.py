@@ -0,0 +1,148 @@
+"""
+Generators of a synthetic semsql ontology database and data files, for benchmarks that run fully offline.
+"""
+
+import random
+import sqlite3
+import string
+from pathlib import Path
+from typing import List, Tuple
+
+import pandas as pd
+
+__all__ = [
+    "make_data",
+    "make_ontology_db",
+]
+
+# Enough of the semsql schema for OAK SqlImplementation and the lexicon to work on the database
+SEMSQL_SCHEMA = """
+CREATE TABLE statements (stanza TEXT, subject TEXT, predicate TEXT, object TEXT, value TEXT, datatype TEXT, language TEXT, graph TEXT);
+CREATE TABLE prefix (prefix TEXT, base TEXT);
+CREATE TABLE edge (subject TEXT, predicate TEXT, object TEXT);
+CREATE TABLE entailed_edge (subject TEXT, predicate TEXT, object TEXT);
+CREATE INDEX statements_subject ON statements (subject);
+CREATE INDEX statements_predicate ON statements (predicate);
+CREATE VIEW rdfs_label_statement AS SELECT * FROM statements WHERE predicate = 'rdfs:label';
+CREATE VIEW ontology_node AS SELECT DISTINCT subject AS id FROM statements WHERE predicate = 'rdf:type' AND object = 'owl:Ontology';
+CREATE VIEW deprecated_node AS SELECT DISTINCT subject AS id FROM statements WHERE predicate = 'owl:deprecated' AND value = 'true';
+"""
+
+SYNONYM_PREDICATES = ("oio:hasExactSynonym", "oio:hasRelatedSynonym", "oio:hasNarrowSynonym", "oio:hasBroadSynonym")
+SUFFIXES = ("disease", "syndrome", "deficiency", "disorder", "type 1", "type 2", "carcinoma", "anomaly")
+
+
+def _words(rng: random.Random, count: int) -> List[str]:
+    return [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 11))) for _ in range(count)]
+
+
+def _phrase(rng: random.Random, vocabulary: List[str]) -> str:
+    words = rng.sample(vocabulary, rng.randint(1, 3))
+    if rng.random() < 0.6:
+        words.append(rng.choice(SUFFIXES))
+    return ' '.join(words)
+
+
+def make_ontology_db(db_path: Path, ontology_id: str = 'bench', classes: int = 20000, max_synonyms: int = 3,
+                     seed: int = 0) -> List[Tuple[str, str]]:
+    """
+    Write a semsql-compatible SQLite database of a synthetic ontology.
+    :param db_path: Location of the database file, replaced if it exists.
+    :param ontology_id: The ontology ID, the CURIE prefix is its upper case form.
+    :param classes: Number of classes.
+    :param max_synonyms: Maximum number of synonyms per class.
+    :param seed: Seed of the random generator.
+    :returns: All (curie, label or synonym) pairs of the ontology, to draw data terms from.
+    """
+    rng = random.Random(seed)
+    vocabulary = _words(rng, max(classes // 4, 100))
+    prefix = ontology_id.upper()
+
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    db_path.unlink(missing_ok=True)
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SEMSQL_SCHEMA)
+    connection.executemany("INSERT INTO prefix VALUES (?, ?)", [
+        (prefix, f"http://purl.obolibrary.org/obo/{prefix}_"),
+        ("obo", "http://purl.obolibrary.org/obo/"),
+    ])
+
+    ontology_iri = f"obo:{ontology_id}.owl"
+    rows = [
+        (ontology_iri, "rdf:type", "owl:Ontology", None),
+        (ontology_iri, "owl:versionIRI", f"http://purl.obolibrary.org/obo/{ontology_id}/releases/2024-01-01/{ontology_id}.owl", None),
+    ]
+    terms = []
+    # Ancestors of each class, itself included, for the entailed_edge closure
+    ancestors = {}
+    for number in range(1, classes + 1):
+        curie = f"{prefix}:{number:07d}"
+        label = _phrase(rng, vocabulary)
+        rows.append((curie, "rdf:type", "owl:Class", None))
+        rows.append((curie, "rdfs:label", None, label))
+        terms.append((curie, label))
+        for _ in range(rng.randint(0, max_synonyms)):
+            synonym = _phrase(rng, vocabulary)
+            rows.append((curie, rng.choice(SYNONYM_PREDICATES), None, synonym))
+            terms.append((curie, synonym))
+        ancestors[curie] = [curie]
+        if number > 1:
+            parent = f"{prefix}:{rng.randint(1, number - 1):07d}"
+            connection.execute("INSERT INTO edge VALUES (?, 'rdfs:subClassOf', ?)", (curie, parent))
+            ancestors[curie] += ancestors[parent]
+    connection.executemany("INSERT INTO statements (subject, predicate, object, value) VALUES (?, ?, ?, ?)", rows)
+    connection.executemany("INSERT INTO entailed_edge VALUES (?, 'rdfs:subClassOf', ?)",
+                           ((curie, ancestor) for curie, curie_ancestors in ancestors.items() for ancestor in curie_ancestors))
+    connection.commit()
+    connection.close()
+    return terms
+
+
+def _typo(rng: random.Random, term: str) -> str:
+    """
+    Apply one random substitution, deletion, insertion or transposition.
+    """
+    position = rng.randrange(len(term))
+    edit = rng.choice(("substitute", "delete", "insert", "transpose"))
+    if edit == "substitute":
+        return term[:position] + rng.choice(string.ascii_lowercase) + term[position + 1:]
+    if edit == "delete" and len(term) > 1:
+        return term[:position] + term[position + 1:]
+    if edit == "transpose" and position < len(term) - 1:
+        return term[:position] + term[position + 1] + term[position] + term[position + 2:]
+    return term[:position] + rng.choice(string.ascii_lowercase) + term[position:]
+
+
+def make_data(terms: List[Tuple[str, str]], rows: int = 100000, repetition_rate: float = 0.5, typo_rate: float = 0.05,
+              miss_rate: float = 0.1, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate a data sheet with the columns of the harmonica input files.
+    :param terms: (curie, label or synonym) pairs of the ontology, as returned by make_ontology_db.
+    :param rows: Number of rows.
+    :param repetition_rate: Fraction of rows repeating a term of an earlier row.
+    :param typo_rate: Fraction of new terms with one typo.
+    :param miss_rate: Fraction of new terms that are not in the ontology.
+    :param seed: Seed of the random generator.
+    """
+    rng = random.Random(seed)
+    vocabulary = _words(rng, 1000)
+    values = []
+    for _ in range(rows):
+        if values and rng.random() < repetition_rate:
+            values.append(rng.choice(values))
+            continue
+        if rng.random() < miss_rate:
+            value = _phrase(rng, vocabulary)
+        else:
+            value = rng.choice(terms)[1]
+            if rng.random() < typo_rate:
+                value = _typo(rng, value)
+        # Vary the case like real data files
+        values.append(value.capitalize() if rng.random() < 0.5 else value)
+    return pd.DataFrame({
+        'study': [f"study_{rng.randint(1, 50)}" for _ in range(rows)],
+        'source_column': 'condition',
+        'source_column_value': values,
+        'conditionMeasureSourceText': values,
+    })
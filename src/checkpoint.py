@@ -0,0 +1,93 @@
+"""
+Checkpoints of the completed parts of a search run, so that a failed run can be resumed without redoing them.
+
+The checkpoints of a run live in a directory named after a hash of everything its results depend on:
+the content of the data file, the ontologies and the search settings. A changed input never resumes from
+stale checkpoints, and the directory is removed once the run completes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import Any, Optional
+
+__all__ = [
+    "DEFAULT_WORK_DIR",
+    "RunCheckpoint",
+]
+
+logger = logging.getLogger("harmonize.checkpoint")
+
+DEFAULT_WORK_DIR = Path.home() / ".data" / "harmonica" / "work"
+
+
+def _file_digest(file_path: Path) -> str:
+    """
+    :returns: The SHA-256 hash of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RunCheckpoint:
+    """
+    Directory of pickled checkpoints of one run, one file per completed part, e.g. an ontology or a chunk of rows.
+    """
+
+    def __init__(self, work_dir: Path, data_path: Path, run_key: dict, resume: bool = False):
+        """
+        :param work_dir: Directory holding the checkpoint directories of all runs.
+        :param data_path: Path of the data file, its content is part of the key of the run.
+        :param run_key: The settings the results depend on, e.g. ontologies, tiers and chunk size.
+        :param resume: Whether to keep the checkpoints of an earlier attempt of the same run.
+        """
+        key = json.dumps({"data": _file_digest(data_path), **run_key}, sort_keys=True, default=str)
+        self.path = Path(work_dir) / f"{Path(data_path).stem}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}"
+        if self.path.exists() and not resume:
+            logger.info(f"Discarding the checkpoints of an earlier attempt at {self.path}, pass --resume to reuse them")
+            shutil.rmtree(self.path)
+        elif resume:
+            completed = len(list(self.path.glob("*.pkl"))) if self.path.exists() else 0
+            logger.info(f"Resuming from {completed} checkpoints at {self.path}")
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _part_path(self, name: str) -> Path:
+        return self.path / f"{name}.pkl"
+
+    def load(self, name: str) -> Optional[Any]:
+        """
+        :param name: Name of the part, e.g. an ontology ID.
+        :returns: The checkpointed data of the part, or None if the part was not completed.
+        """
+        path = self._part_path(name)
+        if not path.exists():
+            return None
+        logger.info(f"Reusing checkpoint {path}")
+        with open(path, "rb") as file:
+            return pickle.load(file)
+
+    def save(self, name: str, data: Any):
+        """
+        Checkpoint a completed part.
+        :param name: Name of the part, e.g. an ontology ID.
+        :param data: The results of the part, e.g. a dataframe.
+        """
+        path = self._part_path(name)
+        # Write to a temporary file first, so a crash while saving never leaves a partial checkpoint
+        temporary_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temporary_path, "wb") as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    def clear(self):
+        """
+        Remove the checkpoints once the run completed.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
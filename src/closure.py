@@ -0,0 +1,167 @@
+"""
+Ancestor closure of a semsql ontology database, to roll matched terms up to grouping classes.
+
+The `entailed_edge` table holds every ancestor of every term. It is read once into CSR arrays of term indices,
+so that the ancestors of all matched terms are gathered and tested against the grouping classes in a few array
+operations, instead of one graph query per term.
+"""
+
+import logging
+import sqlite3
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+__all__ = [
+    "ROLL_UP_PREDICATES",
+    "AncestorClosure",
+    "read_labels",
+    "read_roll_up_terms",
+]
+
+logger = logging.getLogger("harmonize.closure")
+
+# Relations followed up to the grouping classes
+ROLL_UP_PREDICATES = ("rdfs:subClassOf",)
+
+# Edges read from the database per batch
+EDGE_BATCH_SIZE = 100000
+
+
+def read_roll_up_terms(value: str) -> Tuple[str, ...]:
+    """
+    :param value: CURIEs separated by commas, or the path of a file with one CURIE per line, lines starting with
+        '#' are comments.
+    :returns: The distinct CURIEs, in the order given.
+    """
+    path = Path(value)
+    if path.is_file():
+        curies = [line.split('#')[0].strip() for line in path.read_text().splitlines()]
+    else:
+        curies = [curie.strip() for curie in value.split(',')]
+    return tuple(dict.fromkeys(curie for curie in curies if curie))
+
+
+def read_labels(db_path: str, curies: Iterable[str]) -> Dict[str, str]:
+    """
+    :param db_path: Path to the semsql SQLite database file.
+    :param curies: The terms to label.
+    :returns: Mapping of CURIE to rdfs:label, for the terms that have one.
+    """
+    curies = list(curies)
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return dict(connection.execute(
+            "SELECT subject, value FROM statements WHERE predicate = 'rdfs:label' AND value IS NOT NULL "
+            f"AND subject IN ({','.join('?' * len(curies))})", curies))
+    finally:
+        connection.close()
+
+
+class AncestorClosure:
+    """
+    Ancestors of every term of one ontology in compressed sparse row form: the ancestors of the term at index i
+    of `curies` are `indices[indptr[i]:indptr[i + 1]]`, sorted, each term being its own ancestor.
+    """
+
+    def __init__(self, curies: List[str], indptr: "np.ndarray", indices: "np.ndarray"):
+        """
+        :param curies: The terms, sorted, a term is identified by its index in this list.
+        :param indptr: Start of the ancestors of each term in indices, with the end of the last term appended.
+        :param indices: Term indices of the ancestors.
+        """
+        self.curies = curies
+        self.term_index = {curie: index for index, curie in enumerate(curies)}
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_semsql(cls, db_path: str, predicates: Sequence[str] = ROLL_UP_PREDICATES) -> "AncestorClosure":
+        """
+        Read the closure from the entailed_edge table of a semsql SQLite database in one bulk scan.
+        :param db_path: Path to the semsql SQLite database file.
+        :param predicates: The relations to follow.
+        """
+        import numpy as np
+        import pandas as pd
+
+        query = f"SELECT subject, object FROM entailed_edge WHERE predicate IN ({','.join('?' * len(predicates))})"
+        # Encode the CURIEs as integers batch by batch, so the edges are never all held as strings
+        term_index = {}
+        subject_batches, object_batches = [], []
+
+        def encode(batch_curies: List[str]) -> np.ndarray:
+            batch_codes, batch_terms = pd.factorize(np.array(batch_curies, dtype=object))
+            term_codes = np.fromiter((term_index.setdefault(curie, len(term_index)) for curie in batch_terms),
+                                     dtype=np.int64, count=len(batch_terms))
+            return term_codes[batch_codes]
+
+        connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            cursor = connection.execute(query, tuple(predicates))
+            while True:
+                edges = cursor.fetchmany(EDGE_BATCH_SIZE)
+                if not edges:
+                    break
+                subject_batches.append(encode([subject for subject, _ in edges]))
+                object_batches.append(encode([object_ for _, object_ in edges]))
+        finally:
+            connection.close()
+
+        # Renumber the terms in sorted order, so that the ancestors of each term come out sorted, and leave out
+        # the edges of blank nodes
+        curies = np.array(list(term_index), dtype=object)
+        order = np.argsort(curies)
+        order = order[np.array([not curie.startswith('_:') for curie in curies[order]], dtype=bool)]
+        term_count = len(order)
+        codes = np.full(len(curies), -1, dtype=np.int64)
+        codes[order] = np.arange(term_count)
+        subjects = codes[np.concatenate(subject_batches)] if subject_batches else np.zeros(0, dtype=np.int64)
+        objects = codes[np.concatenate(object_batches)] if object_batches else np.zeros(0, dtype=np.int64)
+        is_named_edge = (subjects >= 0) & (objects >= 0)
+
+        # Add the reflexive edges, sort the edges by subject then ancestor and drop duplicates, like the reflexive
+        # edges already entailed
+        subjects = np.concatenate([subjects[is_named_edge], np.arange(term_count)])
+        objects = np.concatenate([objects[is_named_edge], np.arange(term_count)])
+        edge_keys = np.sort(subjects * term_count + objects)
+        edge_keys = edge_keys[np.diff(edge_keys, prepend=-1) != 0]
+        subjects, objects = np.divmod(edge_keys, max(term_count, 1))
+
+        indptr = np.zeros(term_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(subjects, minlength=term_count), out=indptr[1:])
+        closure = cls(curies[order].tolist(), indptr, objects.astype(np.int32))
+        logger.info(f"Ancestor closure of {db_path}: {term_count} terms, {len(edge_keys)} ancestor edges")
+        return closure
+
+    def roll_up(self, curies: Sequence[str], groups: Iterable[str]) -> List[List[str]]:
+        """
+        Find the ancestors of each term among the grouping classes.
+        :param curies: The terms to roll up.
+        :param groups: The grouping classes, those not in the ontology are ignored.
+        :returns: For each term, its ancestors among the groups, itself included if it is one, sorted.
+            Terms not in the ontology have none.
+        """
+        import numpy as np
+
+        is_group = np.zeros(len(self.curies), dtype=bool)
+        is_group[[self.term_index[curie] for curie in groups if curie in self.term_index]] = True
+
+        term_indices = np.array([self.term_index.get(curie, -1) for curie in curies], dtype=np.int64)
+        positions = np.flatnonzero(term_indices >= 0)
+        starts = self.indptr[term_indices[positions]]
+        counts = self.indptr[term_indices[positions] + 1] - starts
+
+        # Gather the ancestors of all terms into one array, with the position of the term each belongs to,
+        # and keep those that are grouping classes
+        owners = np.repeat(positions, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        ancestors = self.indices[np.repeat(starts, counts) + offsets]
+        is_hit = is_group[ancestors]
+
+        rolled_up = [[] for _ in range(len(term_indices))]
+        for owner, ancestor in zip(owners[is_hit].tolist(), ancestors[is_hit].tolist()):
+            rolled_up[owner].append(self.curies[ancestor])
+        return rolled_up
@@ -1,46 +1,27 @@
-from rdflib import Graph, RDF, RDFS, OWL
-from rdflib.plugins.sparql import prepareQuery
+import sqlite3
+
 from oaklib import get_adapter
 from oaklib.datamodels.search import SearchProperty, SearchConfiguration
 import pandas as pd
 from datetime import datetime
 
+from lexicon import LABEL_PREDICATE, read_statements
+from owl_stream import get_owl_classes as read_owl_classes
+from semsql_db import adapter_db_path
+
 
 def get_owl_classes(ontology_file_path):
     """
-    Use rdflib to query for classes.
+    Read the non-obsolete classes and their labels from the OWL file.
     """
     formatted_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print("Start RDFLib Query:", formatted_datetime)
-
-    # Create a RDFLib graph
-    g = Graph()
-
-    # Load the ontology into the graph
-    g.parse(ontology_file_path)
-
-    # Query for all classes using SPARQL
-    query = """
-    SELECT DISTINCT ?class ?label
-    WHERE {
-        ?class a owl:Class .
-        OPTIONAL { ?class rdfs:label ?label }
-        FILTER (
-            STRSTARTS(STR(?class), "http://purl.obolibrary.org/obo/MONDO_") &&
-            !STRSTARTS(?label, "obsolete")
-        )
-    }
-    """
-    
-    # Execute the query on the graph
-    results = g.query(query, initNs={"owl": OWL, "rdfs": RDFS})
+    print("Start OWL Read:", formatted_datetime)
 
-    # Extract the classes and labels from the query results
-    # mondo_classes_with_labels = [(result['class'], result['label']) for result in results]
-    mondo_classes_with_labels = [(str(result['class']), str(result['label'])) for result in results]
+    # Stream the ontology file instead of loading the whole graph into memory
+    mondo_classes_with_labels = read_owl_classes(ontology_file_path)
 
     formatted_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print("End RDFLib Query:  ", formatted_datetime)
+    print("End OWL Read:  ", formatted_datetime)
 
     return mondo_classes_with_labels
 
@@ -75,22 +56,96 @@ def search_ontology(adapter, df, config):
     return search_results_df
 
 
-def main(ontology_file_path):
+def read_db_class_ids(db_path):
+    """
+    :param db_path: Path to the semsql SQLite database file.
+    :returns: The CURIEs of all subjects typed owl:Class.
+    """
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return {subject for subject, in connection.execute(
+            "SELECT DISTINCT subject FROM statements WHERE predicate = 'rdf:type' AND object = 'owl:Class'")}
+    finally:
+        connection.close()
+
+
+def get_db_classes(adapter, ontology_id):
+    """
+    Read all classes of the ontology and their labels from the semsql SQLite database in bulk queries.
+    Only subjects typed owl:Class are kept and those whose label starts with 'obsolete' are left out,
+    like in get_owl_classes.
+    :param adapter: The connector to the ontology database.
+    :param ontology_id: The OBO identifier of the ontology.
+    """
+    db_path = adapter_db_path(adapter)
+    class_ids = read_db_class_ids(db_path)
+    id_prefix = f"{ontology_id.upper()}:"
+    return [
+        (subject, value) for subject, predicate, value in read_statements(db_path)
+        if predicate == LABEL_PREDICATE and subject.startswith(id_prefix) and subject in class_ids
+        and not value.startswith("obsolete")
+    ]
+
+
+def reconcile_classes(owl_classes, db_classes, ontology_id):
     """
-    Get all non-obsolete classes (ie class label starts with 'obsolete' using rdflib)
+    Compare the classes and labels of the OWL file and the semsql database with set operations.
+    :param owl_classes: (class IRI, label) pairs from the OWL file.
+    :param db_classes: (CURIE, label) pairs from the semsql database.
+    :param ontology_id: The OBO identifier of the ontology.
+    :returns: Dataframe of the differing classes with columns id, owl_label, db_label and status:
+        'missing_from_db', 'extra_in_db' or 'label_mismatch'.
+    """
+    iri_prefix = f"http://purl.obolibrary.org/obo/{ontology_id.upper()}_"
+    owl_df = pd.DataFrame(owl_classes, columns=['id', 'label'])
+    owl_df['id'] = owl_df['id'].str.replace(iri_prefix, f"{ontology_id.upper()}:", regex=False)
+    db_df = pd.DataFrame(db_classes, columns=['id', 'label'])
+
+    # One row per class, with all of its labels
+    def join_labels(df):
+        return df.groupby('id')['label'].agg(lambda labels: ' | '.join(sorted(set(labels))))
+
+    diff_df = pd.merge(join_labels(owl_df).rename('owl_label'), join_labels(db_df).rename('db_label'),
+                       how='outer', left_index=True, right_index=True, indicator=True)
+    diff_df['status'] = diff_df['_merge'].astype(str).map({'left_only': 'missing_from_db', 'right_only': 'extra_in_db', 'both': ''})
+    diff_df.loc[(diff_df['_merge'] == 'both') & (diff_df['owl_label'] != diff_df['db_label']), 'status'] = 'label_mismatch'
+    diff_df = diff_df[diff_df['status'] != ''].drop(columns='_merge').fillna('')
+
+    return diff_df.rename_axis('id').reset_index().sort_values(['status', 'id'], ignore_index=True)
+
+
+def main(ontology_file_path, per_class_search=False):
+    """
+    Get all non-obsolete classes (ie class label starts with 'obsolete') from the OWL file
     and check if the class is in the semsql SQLite database for mondo.
+    :param ontology_file_path: Path to the OWL file.
+    :param per_class_search: Search the database for each class label with OAK instead of
+        reconciling the full id/label sets of both sources.
     """
     ontology_id = 'mondo'
     # Get the ontology
     adapter = get_adapter(f"sqlite:obo:{ontology_id}")
 
+    # (1) Get all classes and their labels from the OWL file
+    classes = get_owl_classes(ontology_file_path)
+
+    if not per_class_search:
+        # (2) Get all classes and their labels from the semsql SQLite database and compare both sets
+        diff_df = reconcile_classes(classes, get_db_classes(adapter, ontology_id), ontology_id)
+        print(f"Classes in OWL file: {len({owl_class for owl_class, _ in classes})}")
+        for status, count in diff_df['status'].value_counts().sort_index().items():
+            print(f"{status}: {count}")
+
+        # (3) Write to file
+        print('Saving reconciliation report to file...')
+        diff_df.to_csv('reconciliation_report.csv', index=False)
+        return
+
     exact_label_search_config = SearchConfiguration(
         properties=[SearchProperty.LABEL],
         force_case_insensitive=True,
     )
 
-    # (1) Get all classes and their labels using rdflib
-    classes = get_owl_classes(ontology_file_path)
     data_df = pd.DataFrame(classes)
     print(data_df.head())
     
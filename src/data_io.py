@@ -0,0 +1,350 @@
+"""
+Readers and writers for the data files, whole or in fixed-size chunks of rows.
+"""
+
+import logging
+import math
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import pandas as pd
+
+__all__ = [
+    "ALL",
+    "CELL_COLUMNS",
+    "ChunkWriter",
+    "OUTPUT_FORMATS",
+    "SEARCH_TERM_COLUMN",
+    "iter_input_chunks",
+    "open_chunk_writer",
+    "output_suffix",
+    "read_input",
+    "read_sheets",
+    "resolve_sheets",
+    "sheet_names",
+    "stack_cells",
+]
+
+logger = logging.getLogger("harmonize.data_io")
+
+EXCEL_SUFFIXES = ('.xlsx', '.xlsm')
+TSV_SUFFIXES = ('.tsv', '.tab')
+
+# Output format to file extension
+OUTPUT_FORMATS = {'xlsx': '.xlsx', 'csv': '.csv', 'tsv': '.tsv', 'parquet': '.parquet'}
+
+# Data rows per sheet of an xlsx output file, the 1,048,576 rows of an Excel sheet less the header row
+XLSX_MAX_ROWS = 1048575
+
+# Sheet of the data file read by default, and the name of the only table of CSV, TSV and Parquet files
+DEFAULT_SHEET = 'Sheet1'
+# Selects every sheet or column
+ALL = 'all'
+
+# Columns added by stack_cells: the sheet and column of each searched cell and its value
+SEARCH_TERM_COLUMN = 'search_term'
+CELL_COLUMNS = ['sheet', 'search_column', SEARCH_TERM_COLUMN]
+
+
+def _csv_separator(file_path: Path) -> str:
+    return '\t' if file_path.suffix.lower() in TSV_SUFFIXES else ','
+
+
+def read_input(file_path: Path, sheet_name: str = DEFAULT_SHEET) -> pd.DataFrame:
+    """
+    Read a whole data file into a dataframe.
+    :param file_path: Path to an Excel, CSV, TSV or Parquet file.
+    :param sheet_name: The sheet to read from Excel files.
+    """
+    suffix = file_path.suffix.lower()
+    if suffix in EXCEL_SUFFIXES:
+        return pd.read_excel(pd.ExcelFile(file_path), sheet_name)
+    if suffix == '.parquet':
+        return pd.read_parquet(file_path)
+    return pd.read_csv(file_path, sep=_csv_separator(file_path), dtype=str)
+
+
+def sheet_names(file_path: Path) -> List[str]:
+    """
+    :param file_path: Path to an Excel, CSV, TSV or Parquet file.
+    :returns: The sheets of an Excel file, in workbook order, or the default sheet name for other formats.
+    """
+    if file_path.suffix.lower() not in EXCEL_SUFFIXES:
+        return [DEFAULT_SHEET]
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def resolve_sheets(file_path: Path, sheets: Union[Sequence[str], str] = ALL) -> List[str]:
+    """
+    :param file_path: Path to an Excel, CSV, TSV or Parquet file.
+    :param sheets: The sheets to read from Excel files, or ALL.
+    :returns: The names of the sheets to read, the default sheet name for the single table of other formats.
+    """
+    if file_path.suffix.lower() not in EXCEL_SUFFIXES:
+        return [DEFAULT_SHEET]
+    return sheet_names(file_path) if sheets == ALL else list(sheets)
+
+
+def read_sheets(file_path: Path, sheets: Union[Sequence[str], str] = ALL) -> Dict[str, pd.DataFrame]:
+    """
+    Read several sheets of a data file, opening and parsing the workbook only once.
+    :param file_path: Path to an Excel, CSV, TSV or Parquet file.
+    :param sheets: The sheets to read from Excel files, or ALL. Other formats have a single table.
+    :returns: Dict of sheet name to dataframe, in the order of the sheets.
+    """
+    if file_path.suffix.lower() not in EXCEL_SUFFIXES:
+        return {DEFAULT_SHEET: read_input(file_path)}
+    return pd.read_excel(pd.ExcelFile(file_path), None if sheets == ALL else list(sheets))
+
+
+def stack_cells(sheet_dfs: Dict[str, pd.DataFrame], columns: Union[Sequence[str], str, None] = None) -> pd.DataFrame:
+    """
+    Stack the cells to search of every sheet into one dataframe, one row per non-empty cell, so that the values of
+    all sheets and columns are searched together and each distinct term only once.
+    Each row holds the source row of its cell, plus the CELL_COLUMNS: its sheet, column and value.
+    :param sheet_dfs: Dict of sheet name to dataframe, see read_sheets.
+    :param columns: The columns whose cells are searched, ALL, or None for the third column of each sheet,
+        the column searched by default. Sheets without a column are skipped.
+    """
+    frames = []
+    for sheet, df in sheet_dfs.items():
+        if columns is None:
+            sheet_columns = list(df.columns[2:3])
+        elif columns == ALL:
+            sheet_columns = [column for column in df.columns if column != 'UUID']
+        else:
+            sheet_columns = [column for column in columns if column in df.columns]
+            if len(sheet_columns) < len(columns):
+                missing_columns = [column for column in columns if column not in df.columns]
+                logger.warning(f"Sheet {sheet} has no column {', '.join(map(str, missing_columns))}, skipped")
+        for column in sheet_columns:
+            cells = df[df[column].notna()]
+            frames.append(cells.assign(sheet=sheet, search_column=column, search_term=cells[column]))
+    if not frames:
+        return pd.DataFrame(columns=CELL_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def iter_input_chunks(file_path: Path, chunk_rows: int, sheet_name: str = DEFAULT_SHEET) -> Iterator[pd.DataFrame]:
+    """
+    Read a data file in chunks of rows, without ever loading the whole file.
+    :param file_path: Path to an Excel, CSV, TSV or Parquet file.
+    :param chunk_rows: Number of rows per chunk.
+    :param sheet_name: The sheet to read from Excel files.
+    """
+    suffix = file_path.suffix.lower()
+    if suffix in EXCEL_SUFFIXES:
+        yield from _iter_excel_chunks(file_path, chunk_rows, sheet_name)
+    elif suffix == '.parquet':
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(file_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(file_path, sep=_csv_separator(file_path), dtype=str, chunksize=chunk_rows)
+
+
+def _iter_excel_chunks(file_path: Path, chunk_rows: int, sheet_name: str) -> Iterator[pd.DataFrame]:
+    """
+    Read an Excel sheet in chunks with the read-only row iterator of openpyxl.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+class ChunkWriter:
+    """
+    Appends dataframes to an output file, one chunk at a time, under the header of the first chunk.
+    """
+
+    def __init__(self, file_path: Path):
+        self.file_path = file_path
+        self.rows_written = 0
+        # The header of the file, the columns of the first chunk
+        self.columns: Optional[List[str]] = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        """
+        :param df: The rows to append. Its columns are put in the order of the header, those it lacks are left
+            empty, e.g. for a sheet without some of the columns of the first sheet.
+        :raises ValueError: If the chunk has columns that are not in the header.
+        """
+        if self.columns is None:
+            self.columns = list(df.columns)
+        elif list(df.columns) != self.columns:
+            extra_columns = [column for column in df.columns if column not in self.columns]
+            if extra_columns:
+                raise ValueError(f"Columns {', '.join(map(str, extra_columns))} are not in the header of "
+                                 f"{self.file_path}, which was written from the columns of the first chunk: "
+                                 f"{', '.join(map(str, self.columns))}")
+            df = df.reindex(columns=self.columns, fill_value='')
+        self._write(df)
+        self.rows_written += len(df)
+
+    def _write(self, df: pd.DataFrame) -> None:
+        raise NotImplementedError
+
+    @property
+    def bytes_written(self) -> int:
+        """
+        Size of the output file, complete once the writer is closed.
+        """
+        return self.file_path.stat().st_size if self.file_path.exists() else 0
+
+    def close(self) -> None:
+        logger.info(f"Wrote {self.rows_written} rows to {self.file_path}")
+
+
+class CsvChunkWriter(ChunkWriter):
+
+    def _write(self, df: pd.DataFrame) -> None:
+        df.to_csv(self.file_path, sep=_csv_separator(self.file_path), index=False,
+                  mode='w' if self.rows_written == 0 else 'a', header=self.rows_written == 0)
+
+
+class ParquetChunkWriter(ChunkWriter):
+
+    def __init__(self, file_path: Path, dictionary_columns: Sequence[str] = ()):
+        """
+        :param file_path: Path of the output file.
+        :param dictionary_columns: Columns repeating few distinct values, e.g. CURIEs and labels, stored as Arrow
+            dictionary arrays: each distinct value is stored once per row group and read back as a categorical.
+        """
+        super().__init__(file_path)
+        self.dictionary_columns = dictionary_columns
+        self._writer = None
+        self._schema = None
+
+    def _write(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Store all columns as strings so that every chunk has the same schema
+        table = pa.Table.from_pandas(df.astype(str), preserve_index=False)
+        if self._writer is None:
+            self._schema = pa.schema([
+                pa.field(field.name, pa.dictionary(pa.int32(), pa.string()))
+                if field.name in self.dictionary_columns else field
+                for field in table.schema
+            ])
+            self._writer = pq.ParquetWriter(self.file_path, self._schema)
+        self._writer.write_table(table.cast(self._schema))
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        super().close()
+
+
+def _xlsx_value(value):
+    """
+    :returns: The value of a cell as openpyxl writes it, None for missing values, strings without the control
+        characters that XML does not allow.
+    """
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    if value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS_RE.sub('', value)
+    return value
+
+
+class XlsxChunkWriter(ChunkWriter):
+    """
+    Streams rows to an xlsx file, continuing on a new sheet, 'Sheet2', 'Sheet3', ..., each with the header row,
+    when a sheet holds the maximum number of rows.
+    """
+
+    def __init__(self, file_path: Path, max_rows: int = XLSX_MAX_ROWS):
+        """
+        :param file_path: Path of the output file.
+        :param max_rows: Data rows per sheet.
+        """
+        from openpyxl import Workbook
+
+        super().__init__(file_path)
+        self.max_rows = max_rows
+        # A write-only workbook streams rows to disk instead of keeping the whole workbook model in memory
+        self._workbook = Workbook(write_only=True)
+        self._sheet = None
+        self._sheet_rows = 0
+
+    def _add_sheet(self) -> None:
+        self._sheet = self._workbook.create_sheet(f'Sheet{len(self._workbook.worksheets) + 1}')
+        self._sheet.append(self.columns or [])
+        self._sheet_rows = 0
+
+    def _write(self, df: pd.DataFrame) -> None:
+        if self._sheet is None:
+            self._add_sheet()
+        for row in df.itertuples(index=False, name=None):
+            if self._sheet_rows == self.max_rows:
+                self._add_sheet()
+            self._sheet.append([_xlsx_value(value) for value in row])
+            self._sheet_rows += 1
+
+    @property
+    def sheets_written(self) -> int:
+        return len(self._workbook.worksheets)
+
+    def close(self) -> None:
+        if self._sheet is None:
+            self._add_sheet()
+        self._workbook.save(self.file_path)
+        if self.sheets_written > 1:
+            logger.info(f"Split {self.rows_written} rows over {self.sheets_written} sheets of {self.max_rows} rows")
+        super().close()
+
+
+def open_chunk_writer(file_path: Path, dictionary_columns: Sequence[str] = (),
+                      xlsx_max_rows: int = XLSX_MAX_ROWS) -> ChunkWriter:
+    """
+    Open a writer for the output format given by the file extension.
+    :param file_path: Path of the output file, ending in .xlsx, .csv, .tsv or .parquet.
+    :param dictionary_columns: Columns dictionary-encoded in Parquet files, see ParquetChunkWriter.
+    :param xlsx_max_rows: Data rows per sheet of xlsx files, see XlsxChunkWriter.
+    """
+    suffix = file_path.suffix.lower()
+    if suffix in EXCEL_SUFFIXES:
+        return XlsxChunkWriter(file_path, xlsx_max_rows)
+    if suffix == '.parquet':
+        return ParquetChunkWriter(file_path, dictionary_columns)
+    return CsvChunkWriter(file_path)
+
+
+def output_suffix(input_path: Path, output_format: Optional[str] = None) -> str:
+    """
+    :param input_path: Path of the data file.
+    :param output_format: A key of OUTPUT_FORMATS, or None for the format of the data file.
+    :returns: The extension of the output file.
+    """
+    if output_format is not None:
+        return OUTPUT_FORMATS[output_format]
+    suffix = input_path.suffix.lower()
+    if suffix in TSV_SUFFIXES + ('.csv', '.parquet'):
+        return suffix
+    return '.xlsx'
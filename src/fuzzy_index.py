@@ -0,0 +1,203 @@
+"""
+Character-trigram inverted index with edit distance scoring, for fuzzy matching of misspelled terms.
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+__all__ = [
+    "TrigramIndex",
+    "edit_distances",
+]
+
+logger = logging.getLogger("harmonize.fuzzy_index")
+
+# Number of (term, candidate) pairs scored per vectorized batch
+PAIR_BATCH_SIZE = 100_000
+
+# Trigrams found in more than this fraction of the strings (and at least MIN_COMMON_POSTING strings)
+# are not used to find candidates
+COMMON_TRIGRAM_FRACTION = 0.01
+MIN_COMMON_POSTING = 1000
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _encode(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pack strings into one array of unicode code points.
+    :returns: (code points, start offset of each string, length of each string)
+    """
+    lengths = np.fromiter((len(s) for s in strings), dtype=np.int64, count=len(strings))
+    offsets = np.zeros(len(strings), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    codes = np.frombuffer(''.join(strings).encode('utf-32-le'), dtype=np.uint32)
+    return codes, offsets, lengths
+
+
+def _gather(codes: np.ndarray, offsets: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Gather packed strings into a 2D array padded to the longest string.
+    """
+    width = max(int(lengths.max(initial=0)), 1)
+    positions = offsets[:, None] + np.arange(width)[None, :]
+    np.minimum(positions, len(codes) - 1, out=positions)
+    return codes[positions] if len(codes) else np.zeros((len(offsets), width), dtype=np.uint32)
+
+
+def edit_distances(a: np.ndarray, a_len: np.ndarray, b: np.ndarray, b_len: np.ndarray, max_distance: np.ndarray) -> np.ndarray:
+    """
+    Optimal string alignment (restricted Damerau-Levenshtein) distance of many string pairs at once.
+    Each DP row is computed for all pairs together, with insertions resolved by a running minimum.
+    Pairs are dropped as soon as they are finished or exceed their `max_distance`; the latter get `max_distance + 1`.
+    :param a: 2D array of code points of the first strings, padded.
+    :param a_len: Lengths of the first strings.
+    :param b: 2D array of code points of the second strings, padded.
+    :param b_len: Lengths of the second strings.
+    :param max_distance: Largest distance of interest per pair.
+    :returns: The distance of each pair, capped at `max_distance + 1`.
+    """
+    pairs, width = b.shape
+    steps = np.arange(width + 1, dtype=np.int16)
+    distances = np.minimum(b_len, max_distance + 1).astype(np.int32)
+
+    # Pairs still being scored, and their state
+    active = np.flatnonzero(a_len > 0)
+    a, a_len, b, b_len, max_distance = a[active], a_len[active], b[active], b_len[active], max_distance[active]
+    previous2 = None
+    previous = np.broadcast_to(steps, (len(active), width + 1)).copy()
+
+    for i in range(1, a.shape[1] + 1):
+        if not len(active):
+            break
+        a_char = a[:, i - 1][:, None]
+        current = np.empty_like(previous)
+        current[:, 0] = i
+        # Deletion or substitution
+        np.minimum(previous[:, 1:] + 1, previous[:, :-1] + (a_char != b), out=current[:, 1:])
+        # Transposition of two adjacent characters
+        if previous2 is not None and width > 1:
+            swapped = (a_char == b[:, :-1]) & (a[:, i - 2][:, None] == b[:, 1:])
+            current[:, 2:] = np.where(swapped, np.minimum(current[:, 2:], previous2[:, :-2] + 1), current[:, 2:])
+        # Insertion: current[j] = min(current[j], current[j - 1] + 1) for all j
+        current = np.minimum.accumulate(current - steps, axis=1) + steps
+
+        finished = a_len == i
+        if finished.any():
+            distances[active[finished]] = np.minimum(current[finished, b_len[finished]], max_distance[finished] + 1)
+
+        # Distances never drop below the minimum of two consecutive rows, so drop pairs that cannot stay within bounds
+        row_min = np.minimum(current.min(axis=1), previous.min(axis=1))
+        exceeded = row_min > max_distance
+        if exceeded.any():
+            distances[active[exceeded & ~finished]] = max_distance[exceeded & ~finished] + 1
+        keep = ~(finished | exceeded)
+        if not keep.all():
+            active, a, a_len, b, b_len, max_distance = active[keep], a[keep], a_len[keep], b[keep], b_len[keep], max_distance[keep]
+            current, previous = current[keep], previous[keep]
+        previous2, previous = previous, current
+
+    return distances
+
+
+class TrigramIndex:
+    """
+    Inverted index from character trigrams to strings. Candidates for a query share the most trigrams
+    with it, and are then scored by edit distance relative to the length of the longer string.
+    """
+
+    def __init__(self, strings: Iterable[str]):
+        """
+        :param strings: The distinct normalized strings to index, e.g. all labels and synonyms.
+        """
+        self.strings: List[str] = list(strings)
+        self._codes, self._offsets, self._lengths = _encode(self.strings)
+
+        postings = defaultdict(list)
+        self._gram_counts = np.zeros(len(self.strings), dtype=np.int32)
+        for string_id, string in enumerate(self.strings):
+            grams = _trigrams(string)
+            self._gram_counts[string_id] = len(grams)
+            for gram in grams:
+                postings[gram].append(string_id)
+        self._postings: Dict[str, np.ndarray] = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._max_posting = max(MIN_COMMON_POSTING, int(COMMON_TRIGRAM_FRACTION * len(self.strings)))
+        logger.info(f"Trigram index: {len(self.strings)} strings, {len(self._postings)} trigrams")
+
+    def _candidates(self, query: str, min_score: float, max_candidates: int) -> np.ndarray:
+        """
+        :returns: Ids of the indexed strings sharing the most trigrams with the query.
+        """
+        grams = _trigrams(query)
+        posting_lists = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not posting_lists:
+            return np.empty(0, dtype=np.int32)
+        # Trigrams of common words such as 'disease' say little about a string, and their
+        # posting lists dominate the cost, so leave them out when rarer trigrams are available
+        rare = [ids for ids in posting_lists if len(ids) <= self._max_posting]
+        ids, shared = np.unique(np.concatenate(rare or posting_lists), return_counts=True)
+
+        # An edit distance within bounds implies a length difference within bounds
+        max_distance = int((1 - min_score) * max(len(query), 1) / min_score + 1e-9)
+        keep = np.abs(self._lengths[ids] - len(query)) <= max_distance
+        ids, shared = ids[keep], shared[keep]
+        if len(ids) > max_candidates:
+            dice = shared / (len(grams) + self._gram_counts[ids])
+            ids = ids[np.argpartition(-dice, max_candidates)[:max_candidates]]
+        return ids
+
+    def search(self, queries: Sequence[str], min_score: float = 0.8, top_k: int = 3,
+               max_candidates: int = 20) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Find the indexed strings most similar to each query.
+        The score is 1 - distance / length of the longer string.
+        :param queries: Normalized query strings.
+        :param min_score: Minimum similarity score of a match, between 0 and 1.
+        :param top_k: Maximum number of matches per query.
+        :param max_candidates: Number of trigram candidates scored per query.
+        :returns: Dict of query to list of (matched string, score), best first. Queries without a match are left out.
+        """
+        query_ids, candidate_ids = [], []
+        for query_id, query in enumerate(queries):
+            candidates = self._candidates(query, min_score, max_candidates)
+            query_ids.append(np.full(len(candidates), query_id, dtype=np.int64))
+            candidate_ids.append(candidates)
+        if not queries:
+            return {}
+        query_ids = np.concatenate(query_ids)
+        candidate_ids = np.concatenate(candidate_ids).astype(np.int64)
+        # Batch pairs of similar length together, so little of each padded DP row is wasted
+        by_length = np.argsort(self._lengths[candidate_ids], kind='stable')
+        query_ids, candidate_ids = query_ids[by_length], candidate_ids[by_length]
+
+        query_codes, query_offsets, query_lengths = _encode(queries)
+        scores = np.zeros(len(query_ids))
+        for start in range(0, len(query_ids), PAIR_BATCH_SIZE):
+            batch = slice(start, start + PAIR_BATCH_SIZE)
+            a_len = query_lengths[query_ids[batch]]
+            b_len = self._lengths[candidate_ids[batch]]
+            longest = np.maximum(np.maximum(a_len, b_len), 1)
+            max_distance = np.floor((1 - min_score) * longest + 1e-9).astype(np.int32)
+            distances = edit_distances(
+                _gather(query_codes, query_offsets[query_ids[batch]], a_len), a_len,
+                _gather(self._codes, self._offsets[candidate_ids[batch]], b_len), b_len,
+                max_distance,
+            )
+            scores[batch] = np.where(distances <= max_distance, 1 - distances / longest, 0)
+
+        # Best matches first within each query
+        keep = scores >= min_score - 1e-9
+        query_ids, candidate_ids, scores = query_ids[keep], candidate_ids[keep], scores[keep]
+        order = np.lexsort((candidate_ids, -scores, query_ids))
+        matches = defaultdict(list)
+        for query_id, candidate_id, score in zip(query_ids[order], candidate_ids[order], scores[order]):
+            query_matches = matches[queries[query_id]]
+            if len(query_matches) < top_k:
+                query_matches.append((self.strings[candidate_id], round(float(score), 3)))
+        return dict(matches)
@@ -1,16 +1,31 @@
 #!/usr/bin/env python3
 
+# Annotations name pandas, OAK and tqdm types without importing them, see below
+from __future__ import annotations
+
 import click
+import json
 from datetime import datetime
-import uuid
 import logging
-from oaklib import get_adapter
-from oaklib.datamodels.search import SearchProperty, SearchConfiguration
-from oaklib.implementations.sqldb.sql_implementation import SqlImplementation
-import pandas as pd
-import numpy as np
 from pathlib import Path
-from tqdm import tqdm
+from typing import TYPE_CHECKING, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from checkpoint import DEFAULT_WORK_DIR, RunCheckpoint
+from closure import AncestorClosure, read_labels, read_roll_up_terms
+from lexicon import DEFAULT_LEXICON_DIR, Lexicon, normalize_term
+from match_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES, MatchCache
+from run_metrics import RunMetrics, profiling
+from semsql_db import DEFAULT_PREPARED_DIR, adapter_db_path, create_readonly_engine, find_prepared_db, prepare_db
+
+# oaklib, pandas, numpy and tqdm take seconds to import, so they are imported inside the functions that use them
+# and commands that do not search, like --help, start without loading them
+if TYPE_CHECKING:
+    import pandas as pd
+    from oaklib.datamodels.search import SearchConfiguration
+    from oaklib.implementations.sqldb.sql_implementation import SqlImplementation
+    from tqdm import tqdm
+
+    from incremental import PreviousRun
 
 __all__ = [
     "main",
@@ -19,16 +34,21 @@ __all__ = [
 # Configure logger
 logger = logging.getLogger("harmonize")
 
-logging.basicConfig(
-    level=logging.DEBUG,  # Set the logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
-    format="%(asctime)s.%(msecs)03d [%(levelname)s] (%(module)s) (%(name)s): %(message)s",
-    datefmt='%Y-%m-%d,%H:%M:%S',
-    handlers=[
-        logging.FileHandler("error.log"),  # Log to a file named error.log
-        logging.StreamHandler()  # Also log to the console
-    ],
-    force=True
-)
+
+def configure_logging():
+    """
+    Log to the console and to error.log, set up when the CLI runs rather than when the module is imported.
+    """
+    logging.basicConfig(
+        level=logging.DEBUG,  # Set the logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        format="%(asctime)s.%(msecs)03d [%(levelname)s] (%(module)s) (%(name)s): %(message)s",
+        datefmt='%Y-%m-%d,%H:%M:%S',
+        handlers=[
+            logging.FileHandler("error.log", delay=True),  # Log to a file named error.log, created on the first record
+            logging.StreamHandler()  # Also log to the console
+        ],
+        force=True
+    )
 
 
 @click.group()
@@ -41,6 +61,7 @@ def main(verbose: int, quiet: bool):
     :param verbose: Levels of log messages to display.
     :param quiet: Boolean to be quiet or verbose.
     """
+    configure_logging()
     if verbose >= 2:
         logger.setLevel(level=logging.DEBUG)
     elif verbose == 1:
@@ -51,12 +72,15 @@ def main(verbose: int, quiet: bool):
         logger.setLevel(level=logging.ERROR)
 
 
-def fetch_ontology(ontology_id: str) -> SqlImplementation:
+def fetch_ontology(ontology_id: str, prepared_dir: Optional[Path] = DEFAULT_PREPARED_DIR) -> SqlImplementation:
     """
     Download ontology of interest and convert to SQLite database.
     :param ontology_id: The OBO identifier of the ontology.
-    :returns adapter: The connector to the ontology database.
+    :param prepared_dir: Directory of the database copies indexed by prepare-db, or None to always use the cached database.
+    :returns adapter: The read-only connector to the ontology database, or to its prepared copy.
     """
+    from oaklib import get_adapter
+
     logger.info('** Fetching ontology')
     # TODO: Sort out how to download new ontology version if file already at ~/.data/oaklib
     # This _CAN NOT_ be done automatically. See https://incatools.github.io/ontology-access-kit/faq/troubleshooting.html#my-cached-sqlite-ontology-is-out-of-date
@@ -66,120 +90,742 @@ def fetch_ontology(ontology_id: str) -> SqlImplementation:
         ontology_metadata = adapter.ontology_metadata_map(ont)
         logger.info(f"Ontology metadata: {ontology_metadata['id']}, {ontology_metadata['owl:versionIRI']}")
 
-    return adapter
+    # Search through a tuned read-only connection, with the search indexes of prepare-db when available
+    db_path = adapter_db_path(adapter)
+    prepared_path = find_prepared_db(prepared_dir, ontology_id, db_path)
+    if prepared_path is not None:
+        logger.info(f"Searching the prepared database {prepared_path}")
+    return open_readonly_adapter(prepared_path or db_path)
 
 
-def search_ontology(ontology_id: str, adapter: SqlImplementation, df: pd.DataFrame, config: dict) -> pd.DataFrame:
+def get_ontology_version(adapter: SqlImplementation) -> Optional[str]:
     """
-    Search for exact matches to the ontology term label.
+    Get the version of the ontology in the database.
     :param adapter: The connector to the ontology database.
-    :param df: Dataframe containing terms to search and find matches to the ontology.
+    :returns: The owl:versionIRI of the ontology, or None if it is not set.
+    """
+    for ont in adapter.ontologies():
+        version = adapter.ontology_metadata_map(ont).get('owl:versionIRI')
+        if isinstance(version, list):
+            version = version[0] if version else None
+        if version:
+            return str(version)
+    return None
+
+
+def open_readonly_adapter(db_path: str) -> SqlImplementation:
     """
+    Open a semsql database read-only and in immutable mode, so that many connections
+    can read it concurrently without any locking, with memory-mapped I/O and a large page cache.
+    :param db_path: Path to the semsql SQLite database file.
+    :returns adapter: The connector to the ontology database.
+    """
+    from oaklib.implementations.sqldb.sql_implementation import SqlImplementation
+
+    return SqlImplementation(engine=create_readonly_engine(db_path))
+
+
+# Connector of a search worker process, opened once by _init_search_worker
+_worker_adapter = None
+
+
+def _init_search_worker(db_path: str):
+    global _worker_adapter
+    _worker_adapter = open_readonly_adapter(db_path)
 
-    ontology_prefix = 'hpo' if ontology_id.lower() == 'hp' else ontology_id
-    exact_search_results = []
 
-    # Create a tqdm instance to display search progress
-    progress_bar = tqdm(total=len(df), desc="Processing Rows", unit="row")
+def _search_terms(terms: List[str], config: SearchConfiguration, adapter: Optional[SqlImplementation] = None,
+                  progress_bar: Optional[tqdm] = None, term_rows: Optional[Dict[str, int]] = None) -> Dict[str, List[str]]:
+    """
+    Search the ontology database for each term with OAK basic_search.
+    :param terms: Normalized terms to search.
+    :param config: The OAK search configuration.
+    :param adapter: The connector to the ontology database, the worker connector if None.
+    :param progress_bar: Optional progress bar to advance by the rows of each term.
+    :param term_rows: Number of rows per term, one row for terms not in it.
+    :returns: Dict of term to list of matching CURIEs.
+    """
+    adapter = adapter or _worker_adapter
+    term_rows = term_rows or {}
+    term_curies = {}
+    for term in terms:
+        term_curies[term] = list(adapter.basic_search(term, config=config))
+        if progress_bar is not None:
+            progress_bar.update(term_rows.get(term, 1))
+    return term_curies
+
+
+def resolve_labels(adapter: SqlImplementation, curies: Iterable[str], labels: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+    """
+    Look up the labels of many CURIEs with batched queries instead of one adapter.label() call per CURIE.
+    :param adapter: The connector to the ontology database.
+    :param curies: The CURIEs to resolve.
+    :param labels: Memo of already resolved labels, updated in place and reused for the rest of the run.
+    :returns: The updated memo of CURIE to label, None for CURIEs without a label.
+    """
+    missing = list({curie for curie in curies if curie not in labels})
+    if missing:
+        labels.update(dict.fromkeys(missing))
+        for curie, label in adapter.labels(missing):
+            # Keep the first label, like adapter.label()
+            if labels[curie] is None:
+                labels[curie] = label
+        logger.debug(f"Resolved {len(missing)} labels")
+    return labels
+
+
+# Match tiers in order of preference, with the name of the OAK SearchProperty used for each tier.
+# A term is only searched in a tier when none of the earlier tiers matched it.
+# Tiers without a search property are only served by the lexicon.
+MATCH_TIERS = {
+    'EXACT_LABEL': 'LABEL',
+    'EXACT_ALIAS': 'ALIAS',
+    'PARTIAL': None,
+    'FUZZY': None,
+}
+DEFAULT_TIERS = ('EXACT_LABEL', 'EXACT_ALIAS')
+
+# Tiers whose hits carry a similarity score, with their default options
+SCORED_TIERS = {
+    'PARTIAL': {'min_score': 0.5, 'top_k': 3},
+    'FUZZY': {'min_score': 0.8, 'top_k': 3},
+}
+
 
-    for index, row in df.iterrows():
-        # TODO: Parameterize search column value
-        for result in adapter.basic_search(row.iloc[2], config=config):
-            exact_search_results.append([row["UUID"], result, adapter.label(result)])
-            # Update the progress bar
-            progress_bar.update(1)
+def _search_configuration(tier: str) -> SearchConfiguration:
+    """
+    :returns: The OAK search configuration of an exact match tier.
+    """
+    from oaklib.datamodels.search import SearchConfiguration
+
+    return SearchConfiguration(properties=[MATCH_TIERS[tier]], force_case_insensitive=True)
+
+
+def _tier_cache_key(tier: str, options: dict, engine: str) -> str:
+    """
+    :param engine: The search engine, 'lexicon' or 'oak', whose results differ, e.g. OAK's LIKE patterns treat
+        '%' and '_' as wildcards and only fold the case of ASCII letters.
+    :returns: The match tier name used in the match cache, including the engine and the options that change its
+        results, e.g. 'lexicon:EXACT_LABEL'.
+    """
+    if not options:
+        return f"{engine}:{tier}"
+    return f"{engine}:{tier}({','.join(f'{name}={value}' for name, value in sorted(options.items()))})"
+
+
+def _hit_score(hit: tuple) -> float:
+    """
+    :param hit: A (curie, label) pair from an exact tier, or a (curie, label, score) triple from a scored tier.
+    """
+    return hit[2] if len(hit) > 2 else 1.0
+
+
+def _search_tier(tier: str, ontology_id: str, adapter: SqlImplementation, terms: List[str],
+                 lexicon: Optional[Lexicon] = None, cache: Optional[MatchCache] = None,
+                 ontology_version: Optional[str] = None, workers: int = 1, chunk_size: int = 1000,
+                 labels: Optional[Dict[str, Optional[str]]] = None, options: Optional[dict] = None,
+                 term_rows: Optional[Dict[str, int]] = None, metrics: Optional[RunMetrics] = None,
+                 progress: bool = True) -> Dict[str, list]:
+    """
+    Search distinct normalized terms in one match tier.
+    See search_ontology for the parameters.
+    :param tier: The match tier, a key of MATCH_TIERS.
+    :param terms: Normalized terms to search.
+    :param options: Options of a scored tier, see SCORED_TIERS.
+    :param term_rows: Number of rows per term, to advance the progress bar by rows.
+    :param progress: Whether to display a progress bar.
+    :returns: Dict of term to list of (curie, label), or (curie, label, score) for scored tiers, unfiltered.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    from tqdm import tqdm
+
+    options = {**SCORED_TIERS.get(tier, {}), **(options or {})}
+    cache_key = _tier_cache_key(tier, options, 'lexicon' if lexicon is not None else 'oak')
+    term_rows = term_rows or {}
+    metrics = metrics or RunMetrics()
+
+    def row_count(tier_terms: Iterable[str]) -> int:
+        return sum(term_rows.get(term, 1) for term in tier_terms)
+
+    term_hits = {}
+    if cache is not None:
+        term_hits.update(cache.get_many(ontology_id, ontology_version, cache_key, terms))
+        metrics.count(f'{ontology_id}.{tier}.cache_hits', len(term_hits))
+    terms_to_search = [term for term in terms if term not in term_hits]
+    metrics.count(f'{ontology_id}.{tier}.queries', len(terms_to_search))
+
+    # Create a tqdm instance to display search progress, rows of cached terms are already done
+    progress_bar = tqdm(total=row_count(terms), initial=row_count(term_hits),
+                        desc=f"Processing Rows ({ontology_id} {tier})", unit="row", disable=not progress)
+
+    new_term_curies = {}
+    with metrics.stage(f'{ontology_id}.{tier}'):
+        if MATCH_TIERS[tier] is None:
+            if lexicon is None:
+                raise ValueError(f"The {tier} match tier requires the lexicon engine")
+            # Scored tiers search all terms in vectorized batches and return (curie, score) pairs
+            lookup = lexicon.partial_lookup if tier == 'PARTIAL' else lexicon.fuzzy_lookup
+            new_term_curies = lookup(terms_to_search, **options)
+            progress_bar.update(row_count(terms_to_search))
+        elif lexicon is not None:
+            search_property = MATCH_TIERS[tier]
+            for term in terms_to_search:
+                new_term_curies[term] = lexicon.lookup(term, search_property)
+                # Update the progress bar
+                progress_bar.update(term_rows.get(term, 1))
+        elif workers > 1 and len(terms_to_search) > chunk_size:
+            config = _search_configuration(tier)
+            # Each worker process holds its own read-only connection to the ontology database
+            chunks = [terms_to_search[start:start + chunk_size] for start in range(0, len(terms_to_search), chunk_size)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_search_worker,
+                                     initargs=(adapter_db_path(adapter),)) as executor:
+                futures = {executor.submit(_search_terms, chunk, config): row_count(chunk) for chunk in chunks}
+                for future in as_completed(futures):
+                    new_term_curies.update(future.result())
+                    progress_bar.update(futures[future])
+        else:
+            config = _search_configuration(tier)
+            new_term_curies = _search_terms(terms_to_search, config, adapter, progress_bar, term_rows)
 
     # Close the progress bar
     progress_bar.close()
 
-    # Convert search results to dataframe
-    results_df = pd.DataFrame(exact_search_results)
-    logger.debug(results_df.head())
-
-    # Add column headers
-    if results_df.empty:
-        results_df = pd.DataFrame(columns=['UUID', f'{ontology_prefix}_result_curie', f'{ontology_prefix}_result_label'])
+    # Resolve the labels of all hits at once, the lexicon already holds every label in memory
+    if lexicon is not None:
+        labels = lexicon.labels
     else:
-        results_df.columns = ['UUID', f'{ontology_prefix}_result_curie', f'{ontology_prefix}_result_label']
-
-    # Filter rows to keep those where '{ontology}_result_curie' starts with the "ontology_id", keep in mind hp vs. hpo
-    # TODO: Decide whether these results should still be filtered out
-    results_df = results_df[results_df[f'{ontology_prefix}_result_curie'].str.startswith(f'{ontology_id}'.upper())]
-
-    # Group by 'UUID' and aggregate curie and label into lists
-    search_results_df = results_df.groupby('UUID').agg({
-        f'{ontology_prefix}_result_curie': list,
-        f'{ontology_prefix}_result_label': list
-    }).reset_index()
-
-    # Convert lists to strings
-    search_results_df[f'{ontology_prefix}_result_curie'] = search_results_df[f'{ontology_prefix}_result_curie'].astype(str).str.strip('[]').str.replace("'", "")
-    search_results_df[f'{ontology_prefix}_result_label'] = search_results_df[f'{ontology_prefix}_result_label'].astype(str).str.strip('[]').str.replace("'", "")
-
-    # TODO: Maintain individual columns of result_match_type for each ontology searched!
-    # Add column to indicate type of search match
-    if str(config.properties[0]) == 'LABEL':
-        search_results_df[f'{ontology_prefix}_result_match_type'] = np.where(
-            search_results_df[f'{ontology_prefix}_result_curie'].notnull(), f'{ontology_prefix.upper()}_EXACT_LABEL', '')
-    
-    if str(config.properties[0]) == 'ALIAS':
-        search_results_df[f'{ontology_prefix}_result_match_type'] = np.where(
-            search_results_df[f'{ontology_prefix}_result_curie'].notnull(), f'{ontology_prefix.upper()}_EXACT_ALIAS', '')
+        labels = labels if labels is not None else {}
+        resolved_count = len(labels)
+        with metrics.stage(f'{ontology_id}.labels'):
+            resolve_labels(adapter, (curie for curies in new_term_curies.values() for curie in curies), labels)
+        metrics.count(f'{ontology_id}.labels.resolved', len(labels) - resolved_count)
+    if tier in SCORED_TIERS:
+        new_term_hits = {
+            term: [(curie, labels.get(curie), score) for curie, score in curie_scores]
+            for term, curie_scores in new_term_curies.items()
+        }
+    else:
+        new_term_hits = {
+            term: [(curie, labels.get(curie)) for curie in curies]
+            for term, curies in new_term_curies.items()
+        }
 
-    return search_results_df
+    if cache is not None and new_term_hits:
+        cache.put_many(ontology_id, ontology_version, cache_key, new_term_hits)
+    term_hits.update(new_term_hits)
 
+    return term_hits
 
-def generate_uuid() -> str:
-    """Function to generate UUID"""
-    return str(uuid.uuid4())
 
+def match_terms(ontology_id: str, adapter: SqlImplementation, terms: List[str], tiers: Iterable[str] = DEFAULT_TIERS,
+                lexicon: Optional[Lexicon] = None, cache: Optional[MatchCache] = None,
+                ontology_version: Optional[str] = None, workers: int = 1, chunk_size: int = 1000,
+                labels: Optional[Dict[str, Optional[str]]] = None, tier_options: Optional[Dict[str, dict]] = None,
+                term_rows: Optional[Dict[str, int]] = None, metrics: Optional[RunMetrics] = None,
+                progress: bool = True) -> Dict[str, Tuple[str, list]]:
+    """
+    Search distinct normalized terms in the match tiers, each term only until a tier matches it.
+    See search_ontology for the parameters.
+    :param terms: Distinct normalized terms to search.
+    :param term_rows: Number of rows per term, for the progress bars and the rows matched per tier.
+    :param progress: Whether to display progress bars.
+    :returns: Dict of matched term to (best tier, hits of the ontology in that tier).
+    """
+    if labels is None:
+        labels = {}
+    tier_options = tier_options or {}
+    term_rows = term_rows or {}
+    metrics = metrics or RunMetrics()
+
+    remaining_terms = list(terms)
+    # Best tier and hits per term
+    term_matches = {}
+    for tier in tiers:
+        if not remaining_terms:
+            break
+        searched_count = len(remaining_terms)
+        tier_hits = _search_tier(tier, ontology_id, adapter, remaining_terms, lexicon, cache, ontology_version,
+                                 workers, chunk_size, labels, tier_options.get(tier), term_rows, metrics, progress)
+        matched_rows = 0
+        for term, hits in tier_hits.items():
+            # Keep hits where the curie starts with the "ontology_id", keep in mind hp vs. hpo
+            # TODO: Decide whether these results should still be filtered out
+            hits = [hit for hit in hits if hit[0].startswith(ontology_id.upper())]
+            if hits:
+                term_matches[term] = (tier, hits)
+                matched_rows += term_rows.get(term, 1)
+        remaining_terms = [term for term in remaining_terms if term not in term_matches]
+        metrics.count(f'{ontology_id}.{tier}.rows_matched', matched_rows)
+        logger.info(f"{ontology_id} {tier}: {searched_count - len(remaining_terms)} of {searched_count} terms matched")
 
-def _clean_up_columns(df: pd.DataFrame, ontology_id: str) -> pd.DataFrame:
+    return term_matches
+
+
+def search_ontology(ontology_id: str, adapter: SqlImplementation, df: pd.DataFrame,
+                    tiers: Iterable[str] = DEFAULT_TIERS,
+                    lexicon: Optional[Lexicon] = None, cache: Optional[MatchCache] = None,
+                    ontology_version: Optional[str] = None, workers: int = 1, chunk_size: int = 1000,
+                    labels: Optional[Dict[str, Optional[str]]] = None,
+                    tier_options: Optional[Dict[str, dict]] = None,
+                    metrics: Optional[RunMetrics] = None, term_column: Optional[str] = None) -> pd.DataFrame:
     """
-    Copy over the search results to the columns from the input dataframe
-    amd remove the extra columns added with the search results.
-    :param df: The dataframe from the merge of the search results with the original dataframe.
-    :param ontology_id: The ontology identifier, ie. the ontology being searched  
+    Search for matches to the ontology in a single pass over the match tiers.
+    Each distinct normalized term is searched once and the results of the best matching tier are copied to every
+    row containing it.
+    :param adapter: The connector to the ontology database.
+    :param df: Dataframe containing terms to search and find matches to the ontology.
+    :param tiers: The match tiers to search, in order of preference.
+    :param lexicon: Optional in-memory index of the ontology, used instead of per-row adapter searches.
+    :param cache: Optional persistent cache of results, checked before any search is issued.
+    :param ontology_version: The owl:versionIRI of the ontology, part of the cache key.
+    :param workers: Number of worker processes for adapter searches.
+    :param chunk_size: Number of terms per worker task.
+    :param labels: Memo of CURIE labels, shared by the match tiers.
+    :param tier_options: Options per scored tier, e.g. {'FUZZY': {'min_score': 0.8, 'top_k': 3}}.
+    :param metrics: Optional metrics of the run, with the time of each tier and the rows matched per tier.
+    :param term_column: The column of terms to search, the third column if None.
     """
+    import pandas as pd
+
     ontology_prefix = 'hpo' if ontology_id.lower() == 'hp' else ontology_id
+    tiers = list(tiers)
+    metrics = metrics or RunMetrics()
 
-    # Handle clean-up after a second round of synonym search
-    if f'{ontology_prefix}_result_match_type_x' in df.columns and f'{ontology_prefix}_result_match_type_y' in df.columns:
-        # Copy result label values to original df column and then drop result column
-        df[f'{ontology_prefix}Label'] = np.where(df[f'{ontology_prefix}_result_label'].notnull(), df[f'{ontology_prefix}_result_label'], df[f'{ontology_prefix}Label'])
-        df.drop([f'{ontology_prefix}_result_label'], axis=1, inplace=True)
+    terms = (df.iloc[:, 2] if term_column is None else df[term_column]).map(normalize_term)
+    term_rows = terms.value_counts(sort=False).to_dict()
+    distinct_terms = terms.dropna().unique().tolist()
+    metrics.count(f'{ontology_id}.rows', len(df))
+    metrics.count(f'{ontology_id}.terms', len(distinct_terms))
 
-        # Copy result curie values to original df column and then drop result column
-        df[f'{ontology_prefix}Code'] = np.where(df[f'{ontology_prefix}_result_curie'].notnull(), df[f'{ontology_prefix}_result_curie'], df[f'{ontology_prefix}Code'])
-        df.drop([f'{ontology_prefix}_result_curie'], axis=1, inplace=True)
+    term_matches = match_terms(ontology_id, adapter, distinct_terms, tiers, lexicon, cache, ontology_version, workers,
+                               chunk_size, labels, tier_options, term_rows, metrics)
 
-        # Copy type of result match to original df column and then drop result column and rename original df column
-        df[f'{ontology_prefix}_result_match_type_x'] = np.where(df[f'{ontology_prefix}_result_match_type_y'].notnull(), df[f'{ontology_prefix}_result_match_type_y'], df[f'{ontology_prefix}_result_match_type_x'])
-        df.drop([f'{ontology_prefix}_result_match_type_y'], axis=1, inplace=True)
-        df = df.rename(columns={f'{ontology_prefix}_result_match_type_x': f'{ontology_prefix}_result_match_type'})
-    else:
-        # Update values in the existing columns
-        df[f'{ontology_prefix}Label'] = df[f'{ontology_prefix}_result_label']
-        df[f'{ontology_prefix}Code'] = df[f'{ontology_prefix}_result_curie']
-    
-        # Drop the search_results columns
-        df.drop([f'{ontology_prefix}_result_label'], axis=1, inplace=True)
-        df.drop([f'{ontology_prefix}_result_curie'], axis=1, inplace=True)
+    with metrics.stage(f'{ontology_id}.aggregation'):
+        # One joined CURIE and label string per matched term
+        # TODO: Maintain individual columns of result_match_type for each ontology searched!
+        result_columns = [f'{ontology_prefix}_result_curie', f'{ontology_prefix}_result_label', f'{ontology_prefix}_result_match_type']
+        term_results = {
+            term: [', '.join(hit[0] for hit in hits), ', '.join(hit[1] or '' for hit in hits), f'{ontology_prefix.upper()}_{tier}']
+            for term, (tier, hits) in term_matches.items()
+        }
+        # Report how close each hit is when a scored tier was searched, exact hits score 1
+        if any(tier in SCORED_TIERS for tier in tiers):
+            result_columns.append(f'{ontology_prefix}_result_score')
+            for term, (tier, hits) in term_matches.items():
+                term_results[term].append(', '.join(f'{_hit_score(hit):.2f}' for hit in hits))
+        term_results_df = pd.DataFrame.from_dict(term_results, orient='index', columns=result_columns)
+
+        # Copy the results of each term to the rows it appears in. Rows share the string objects of their term.
+        is_matched = terms.isin(term_results_df.index).to_numpy()
+        search_results_df = term_results_df.loc[terms.to_numpy()[is_matched]].reset_index(drop=True)
+        search_results_df.insert(0, 'UUID', df['UUID'].to_numpy()[is_matched])
+    logger.debug(search_results_df.head())
+
+    return search_results_df
+
+
+def roll_up_results(ontology_id: str, search_results_df: pd.DataFrame, closure: AncestorClosure,
+                    groups: Mapping[str, Optional[str]], metrics: Optional[RunMetrics] = None) -> pd.DataFrame:
+    """
+    Roll the matched terms of each row up to their ancestors among the grouping classes.
+    Each distinct matched CURIE is rolled up once, the ancestors of all of them are tested against the grouping
+    classes together, see AncestorClosure.roll_up.
+    :param search_results_df: The search results of the ontology, see search_ontology.
+    :param closure: The ancestor closure of the ontology.
+    :param groups: Mapping of the grouping classes in the ontology to their labels.
+    :param metrics: Optional metrics of the run, with the time of the roll-up and the rows rolled up.
+    :returns: The search results with the grouping classes of each row in '<ontology>_rollup_curie' and
+        their labels in '<ontology>_rollup_label'.
+    """
+    ontology_prefix = 'hpo' if ontology_id.lower() == 'hp' else ontology_id
+    metrics = metrics or RunMetrics()
+
+    with metrics.stage(f'{ontology_id}.roll_up'):
+        # Rows share the joined CURIE string of their term, and terms share CURIEs
+        matched = search_results_df[f'{ontology_prefix}_result_curie'].unique().tolist()
+        curies = sorted({curie for value in matched for curie in value.split(', ') if curie})
+        curie_groups = dict(zip(curies, closure.roll_up(curies, groups)))
+        rollup_curies, rollup_labels = {}, {}
+        for value in matched:
+            ancestors = sorted({group for curie in value.split(', ') for group in curie_groups.get(curie, ())})
+            rollup_curies[value] = ', '.join(ancestors)
+            rollup_labels[value] = ', '.join(groups.get(group) or '' for group in ancestors)
+        search_results_df = search_results_df.assign(**{
+            f'{ontology_prefix}_rollup_curie': search_results_df[f'{ontology_prefix}_result_curie'].map(rollup_curies),
+            f'{ontology_prefix}_rollup_label': search_results_df[f'{ontology_prefix}_result_curie'].map(rollup_labels),
+        })
+        metrics.count(f'{ontology_id}.rows_rolled_up', int((search_results_df[f'{ontology_prefix}_rollup_curie'] != '').sum()))
+    return search_results_df
+
+
+class OntologySearcher:
+    """
+    An ontology with its index, match cache and label memo, to be searched with any number of dataframes.
+    The ontology is opened on the first search, or on first access to its version, so that runs which never
+    query it, e.g. when every part of the run is checkpointed, do not pay for loading it.
+    """
+
+    def __init__(self, ontology_id: str, engine: str = 'lexicon', cache_path: Optional[Path] = None,
+                 cache_max_entries: int = DEFAULT_MAX_ENTRIES, search_workers: int = 1, chunk_size: int = 1000,
+                 tiers: Iterable[str] = DEFAULT_TIERS, tier_options: Optional[Dict[str, dict]] = None,
+                 lexicon_dir: Optional[Path] = DEFAULT_LEXICON_DIR, metrics: Optional[RunMetrics] = None,
+                 roll_up: Sequence[str] = ()):
+        """
+        :param ontology_id: The OBO identifier of the ontology.
+        :param engine: The search engine to use, 'lexicon' or 'oak'.
+        :param cache_path: Location of the match cache database, or None to not use the cache.
+        :param cache_max_entries: Size limit of the match cache.
+        :param search_workers: Number of worker processes searching chunks of terms of this ontology.
+        :param chunk_size: Number of terms per worker task.
+        :param tiers: The match tiers to search, in order of preference.
+        :param tier_options: Options per scored tier, see SCORED_TIERS.
+        :param lexicon_dir: Directory of lexicon artifacts made by build-lexicon, or None to always read the database.
+        :param metrics: Optional metrics of the run, with the time spent opening the ontology and searching it.
+        :param roll_up: Grouping classes to roll the matched terms up to, of any ontology, none to not roll up.
+        """
+        self.ontology_id = ontology_id
+        self.engine = engine
+        self.cache_path = cache_path
+        self.cache_max_entries = cache_max_entries
+        self.lexicon_dir = lexicon_dir
+        self.metrics = metrics or RunMetrics()
+        self.search_workers = search_workers
+        self.chunk_size = chunk_size
+        self.tiers = tuple(tiers)
+        self.tier_options = tier_options
+        self.roll_up_terms = tuple(roll_up)
+        self.labels = {}
+
+        # Set by open()
+        self.is_open = False
+        self.adapter = None
+        self.lexicon = None
+        self.match_cache = None
+        self._ontology_version = None
+        # Set by the first roll-up
+        self.closure = None
+        self.roll_up_groups = None
+
+    def open(self):
+        """
+        Open the ontology and the match cache, unless already open.
+        """
+        if self.is_open:
+            return
+        ontology_id = self.ontology_id
+
+        # Get the ontology
+        # A prebuilt lexicon artifact is memory-mapped and replaces the ontology database altogether
+        artifact = None
+        with self.metrics.stage(f'{ontology_id}.fetch'):
+            if self.engine == 'lexicon' and self.lexicon_dir is not None:
+                from lexicon_artifact import open_lexicon_artifact
+                artifact = open_lexicon_artifact(self.lexicon_dir, ontology_id)
+            if artifact is not None:
+                self.lexicon = artifact.to_lexicon()
+            else:
+                self.adapter = fetch_ontology(ontology_id)
+        if artifact is None and self.engine == 'lexicon':
+            with self.metrics.stage(f'{ontology_id}.lexicon'):
+                self.lexicon = Lexicon.from_adapter(ontology_id, self.adapter)
 
+        self._ontology_version = artifact.version if artifact is not None else get_ontology_version(self.adapter)
+        self.metrics.versions[ontology_id] = self._ontology_version
 
-    return df
+        # Results are only cached for ontologies that carry a version to key them on
+        if self.cache_path is not None:
+            if self._ontology_version:
+                self.match_cache = MatchCache(self.cache_path, self.cache_max_entries)
+            else:
+                logger.warning(f"No owl:versionIRI found for {ontology_id}, match cache disabled for this ontology")
+        self.is_open = True
+
+    @property
+    def ontology_version(self) -> Optional[str]:
+        """
+        The owl:versionIRI of the ontology, opening it if needed.
+        """
+        self.open()
+        return self._ontology_version
+
+    def search(self, data_df: pd.DataFrame, term_column: Optional[str] = None) -> pd.DataFrame:
+        """
+        Search the ontology for matches to the terms in the data, best match tier first.
+        :param data_df: Dataframe containing terms to search, with a 'UUID' column.
+        :param term_column: The column of terms to search, the third column if None.
+        :returns: The search result columns of this ontology for the matched rows, keyed by 'UUID'.
+        """
+        self.open()
+        return self.roll_up(search_ontology(self.ontology_id, self.adapter, data_df, self.tiers, self.lexicon,
+                                            self.match_cache, self.ontology_version, self.search_workers,
+                                            self.chunk_size, self.labels, self.tier_options, self.metrics, term_column))
+
+    def roll_up(self, search_results_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add the grouping classes of the matched terms to search results, see roll_up_results.
+        The ancestor closure of the ontology is read from its database once, on the first roll-up.
+        :param search_results_df: The search results of the ontology, see search_ontology.
+        :returns: The search results, unchanged if there are no grouping classes to roll up to.
+        """
+        if not self.roll_up_terms:
+            return search_results_df
+        if self.closure is None:
+            with self.metrics.stage(f'{self.ontology_id}.closure'):
+                # Lexicon artifacts do not carry the closure, it is always read from the database
+                db_path = adapter_db_path(self.adapter or fetch_ontology(self.ontology_id))
+                self.closure = AncestorClosure.from_semsql(db_path)
+                groups = [curie for curie in self.roll_up_terms if curie in self.closure.term_index]
+                labels = read_labels(db_path, groups)
+                self.roll_up_groups = {curie: labels.get(curie) for curie in groups}
+            logger.info(f"{self.ontology_id}: rolling up to {len(self.roll_up_groups)} of "
+                        f"{len(self.roll_up_terms)} grouping classes")
+        return roll_up_results(self.ontology_id, search_results_df, self.closure, self.roll_up_groups, self.metrics)
+
+    def warm(self):
+        """
+        Open the ontology and build the indexes of the scored tiers now instead of on the first search.
+        """
+        self.open()
+        if self.lexicon is not None:
+            if 'PARTIAL' in self.tiers:
+                self.lexicon.partial_lookup([])
+            if 'FUZZY' in self.tiers:
+                self.lexicon.fuzzy_lookup([])
+
+    def match_terms(self, terms: List[str], tiers: Optional[Iterable[str]] = None,
+                    progress: bool = True) -> Dict[str, Tuple[str, list]]:
+        """
+        Search distinct normalized terms, best match tier first.
+        :param terms: Distinct normalized terms to search.
+        :param tiers: The match tiers to search, the tiers of the searcher if None.
+        :param progress: Whether to display progress bars.
+        :returns: Dict of matched term to (best tier, hits), see match_terms.
+        """
+        self.open()
+        return match_terms(self.ontology_id, self.adapter, terms, self.tiers if tiers is None else tiers, self.lexicon,
+                           self.match_cache, self.ontology_version, self.search_workers, self.chunk_size, self.labels,
+                           self.tier_options, metrics=self.metrics, progress=progress)
+
+    def close(self):
+        if self.match_cache is not None:
+            logger.info(f"Match cache {self.ontology_id}: {self.match_cache.hits} hits, {self.match_cache.misses} misses")
+            self.match_cache.close()
+
+
+def harmonize_ontology(ontology_id: str, data_df: pd.DataFrame, engine: str = 'lexicon',
+                       cache_path: Optional[Path] = None, cache_max_entries: int = DEFAULT_MAX_ENTRIES,
+                       search_workers: int = 1, chunk_size: int = 1000, tiers: Iterable[str] = DEFAULT_TIERS,
+                       tier_options: Optional[Dict[str, dict]] = None,
+                       lexicon_dir: Optional[Path] = DEFAULT_LEXICON_DIR,
+                       metrics: Optional[RunMetrics] = None, previous: Optional[PreviousRun] = None,
+                       term_column: Optional[str] = None, roll_up: Sequence[str] = ()) -> pd.DataFrame:
+    """
+    Open one ontology and search it for matches to the terms in the data.
+    Runs standalone so that ontologies can be processed in separate worker processes.
+    See OntologySearcher for the parameters.
+    :param previous: Optional output of a previous run, whose results are reused for the rows it already has
+        when the ontology version and search settings did not change.
+    :param term_column: The column of terms to search, the third column if None.
+    :returns: The search result columns of this ontology for the matched rows, keyed by 'UUID'.
+    """
+    import pandas as pd
+
+    from incremental import run_settings
+
+    searcher = OntologySearcher(ontology_id, engine, cache_path, cache_max_entries, search_workers, chunk_size,
+                                tiers, tier_options, lexicon_dir, metrics, roll_up)
+    try:
+        if previous is None or not previous.is_reusable(ontology_id, searcher.ontology_version,
+                                                        run_settings(engine, tiers, tier_options)):
+            return searcher.search(data_df, term_column)
+        # Row IDs are derived from the row content, so only new or changed rows are not in the previous output
+        is_new = ~data_df['UUID'].isin(previous.row_ids)
+        logger.info(f"{ontology_id}: reusing the results of {(~is_new).sum()} rows, searching {is_new.sum()} new rows")
+        searcher.metrics.count(f'{ontology_id}.rows_reused', (~is_new).sum())
+        # The grouping classes may differ from the previous run, so reused rows are rolled up again
+        return pd.concat([searcher.roll_up(previous.search_results(ontology_id, data_df['UUID'])),
+                          searcher.search(data_df[is_new], term_column)], ignore_index=True)
+    finally:
+        searcher.close()
+
+
+def _harmonize_ontology_job(ontology_id: str, data_df: pd.DataFrame, log_metrics: bool, **searcher_kwargs):
+    """
+    Run harmonize_ontology in a worker process with its own metrics, returned to be merged into those of the run.
+    :returns: (search results, metrics)
+    """
+    metrics = RunMetrics(log_metrics)
+    return harmonize_ontology(ontology_id, data_df, metrics=metrics, **searcher_kwargs), metrics
+
+
+# Columns of the data file kept in the output, the ontology result columns are added to them
+COLUMNS_TO_KEEP = ['UUID', 'study', 'source_column', 'source_column_value', 'conditionMeasureSourceText']
+RESULT_COLUMNS = [
+    'hpoLabel', 'hpoCode', 'hpo_result_match_type', 'hpo_result_score', 'hpo_rollup_curie', 'hpo_rollup_label',
+    'mondoLabel', 'mondoCode', 'mondo_result_match_type', 'mondo_result_score', 'mondo_rollup_curie', 'mondo_rollup_label',
+    'maxoLabel', 'maxoCode', 'maxo_result_match_type', 'maxo_result_score', 'maxo_rollup_curie', 'maxo_rollup_label',
+    'otherLabel', 'otherCode', 'Trish Notes']
+# Output columns repeating few distinct values, like CURIEs and labels, dictionary-encoded in Parquet output files
+DICTIONARY_COLUMNS = RESULT_COLUMNS + ['sheet', 'search_column']
+
+
+def combine_results(data_df: pd.DataFrame, all_final_results_dict: Dict[str, pd.DataFrame],
+                    metrics: Optional[RunMetrics] = None) -> pd.DataFrame:
+    """
+    Attach the search result columns of every ontology to the input rows, keyed by UUID.
+    Each input row appears once, the '<ontology>Label' and '<ontology>Code' columns of a searched ontology
+    are replaced by its search results.
+    :param data_df: Dataframe containing the searched terms, with a 'UUID' column, or the stacked cells of
+        several sheets and columns, see data_io.stack_cells.
+    :param all_final_results_dict: Dict of ontology ID to the search results of that ontology.
+    :param metrics: Optional metrics of the run, with the time of the merges.
+    :returns: The combined dataframe.
+    """
+    from data_io import CELL_COLUMNS
+
+    metrics = metrics or RunMetrics()
+    with metrics.stage('merge'):
+        combined_df = data_df.copy()
+        for ontology_id, search_results_df in all_final_results_dict.items():
+            ontology_prefix = 'hpo' if ontology_id.lower() == 'hp' else ontology_id
+            search_results_df = search_results_df.set_index('UUID')
+            combined_df[f'{ontology_prefix}Label'] = combined_df['UUID'].map(search_results_df[f'{ontology_prefix}_result_label'])
+            combined_df[f'{ontology_prefix}Code'] = combined_df['UUID'].map(search_results_df[f'{ontology_prefix}_result_curie'])
+            combined_df[f'{ontology_prefix}_result_match_type'] = combined_df['UUID'].map(search_results_df[f'{ontology_prefix}_result_match_type'])
+            for column in [f'{ontology_prefix}_result_score', f'{ontology_prefix}_rollup_curie', f'{ontology_prefix}_rollup_label']:
+                if column in search_results_df.columns:
+                    combined_df[column] = combined_df['UUID'].map(search_results_df[column])
+
+        # Add the result columns _if_ they exist within the dataframe, stacked cells also keep their sheet and column
+        columns = [col for col in COLUMNS_TO_KEEP + CELL_COLUMNS if col in combined_df.columns] + \
+            [col for col in combined_df.columns if col in RESULT_COLUMNS]
+
+        # Replace NaN values with empty string
+        return combined_df[columns].fillna('')
+
+
+def _parse_tiers(tiers: str, engine: str) -> tuple:
+    """
+    :param tiers: The --tiers option, match tiers separated by commas.
+    :param engine: The search engine, 'lexicon' or 'oak'.
+    :returns: The match tiers, validated for the engine.
+    """
+    tiers = tuple(tier.strip().upper() for tier in tiers.split(','))
+    unknown_tiers = [tier for tier in tiers if tier not in MATCH_TIERS]
+    if unknown_tiers:
+        raise click.BadParameter(f"Unknown match tiers {', '.join(unknown_tiers)}", param_hint='--tiers')
+    if engine == 'oak' and any(MATCH_TIERS[tier] is None for tier in tiers):
+        raise click.BadParameter("PARTIAL and FUZZY matching require the lexicon engine", param_hint='--tiers')
+    return tiers
 
 
 @main.command("search")
 @click.option('--oid', '-o', help='Ontology IDs separated by commas')
 @click.option('--data_filename', '-d')
-def search(oid: tuple, data_filename: str):
+@click.option('--sheets', default='Sheet1', show_default=True,
+              help='Sheets of an Excel data file to search, separated by commas, or "all"')
+@click.option('--columns', default=None,
+              help='Columns whose values are searched, separated by commas, or "all", the third column if not given. '
+                   'The cells of several sheets or columns are searched together, each distinct term once')
+@click.option('--engine', type=click.Choice(['lexicon', 'oak']), default='lexicon', show_default=True,
+              help='Match with an in-memory index of labels and synonyms, or with per-row OAK basic_search queries')
+@click.option('--cache/--no-cache', 'use_cache', default=True, show_default=True,
+              help='Reuse search results from previous runs against the same ontology version')
+@click.option('--cache-path', type=click.Path(path_type=Path), default=DEFAULT_CACHE_PATH, show_default=True)
+@click.option('--cache-max-entries', type=int, default=DEFAULT_MAX_ENTRIES, show_default=True,
+              help='Least recently used terms are evicted from the cache beyond this size')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of ontologies to search in parallel worker processes')
+@click.option('--search-workers', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of worker processes searching chunks of terms within one ontology (oak engine)')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=1000, show_default=True,
+              help='Number of terms per search worker task')
+@click.option('--tiers', default=','.join(DEFAULT_TIERS), show_default=True,
+              help=f'Match tiers separated by commas, in order of preference, from: {", ".join(MATCH_TIERS)}')
+@click.option('--partial-min-score', type=click.FloatRange(0, 1), default=SCORED_TIERS['PARTIAL']['min_score'], show_default=True,
+              help='Minimum fraction of the label or synonym covered by a PARTIAL match')
+@click.option('--partial-top-k', type=click.IntRange(min=1), default=SCORED_TIERS['PARTIAL']['top_k'], show_default=True,
+              help='Maximum number of PARTIAL matches per term')
+@click.option('--fuzzy-min-score', type=click.FloatRange(0, 1), default=SCORED_TIERS['FUZZY']['min_score'], show_default=True,
+              help='Minimum similarity (1 - edit distance / length) of a FUZZY match')
+@click.option('--fuzzy-top-k', type=click.IntRange(min=1), default=SCORED_TIERS['FUZZY']['top_k'], show_default=True,
+              help='Maximum number of FUZZY matches per term')
+@click.option('--lexicon-dir', type=click.Path(path_type=Path), default=DEFAULT_LEXICON_DIR, show_default=True,
+              help='Directory of lexicon artifacts made by build-lexicon, used instead of the ontology database when present')
+@click.option('--roll-up', default=None,
+              help='Grouping classes to roll the matched terms up to, CURIEs separated by commas or a file with one CURIE '
+                   'per line. Adds the ancestors of the matched terms among them to the output')
+@click.option('--output-format', type=click.Choice(['xlsx', 'csv', 'tsv', 'parquet']), default=None,
+              help='Format of the output file, the format of the data file if not given')
+@click.option('--xlsx-max-rows', type=click.IntRange(min=1), default=1048575, show_default=True,
+              help='Rows per sheet of xlsx output, further rows continue on new sheets (Excel allows 1,048,576 with the header)')
+@click.option('--stream', is_flag=True, default=False,
+              help='Read, harmonize and write the data file in chunks of rows to keep memory use bounded')
+@click.option('--stream-rows', type=click.IntRange(min=1), default=50000, show_default=True,
+              help='Number of rows per chunk in streaming mode')
+@click.option('--metrics-path', type=click.Path(path_type=Path), default=None,
+              help='Write the time of each stage and the query, cache hit and match counters of the run to this JSON file')
+@click.option('--log-metrics', is_flag=True, default=False,
+              help='Log the time of each stage as it ends and a summary of the metrics at the end of the run')
+@click.option('--profile', 'profile_path', type=click.Path(path_type=Path), default=None,
+              help='Profile the run with cProfile and write the statistics to this file')
+@click.option('--trace-memory', is_flag=True, default=False,
+              help='Trace memory allocations with tracemalloc and add the peak and top allocation sites to the metrics')
+@click.option('--incremental', is_flag=True, default=False,
+              help='Reuse the results of the previous output for unchanged rows, searching only new or changed rows')
+@click.option('--previous-output', type=click.Path(exists=True, dir_okay=False, path_type=Path), default=None,
+              help='Output file to reuse in incremental mode, the latest output of the same ontologies if not given')
+@click.option('--work-dir', type=click.Path(path_type=Path), default=DEFAULT_WORK_DIR, show_default=True,
+              help='Directory of the checkpoints of completed ontologies and chunks of rows, removed when the run completes')
+@click.option('--resume', is_flag=True, default=False,
+              help='Resume a failed run with the same data file and settings, skipping its checkpointed work')
+def search(oid: tuple, data_filename: str, sheets: str, columns: str, engine: str, use_cache: bool, cache_path: Path, cache_max_entries: int,
+           jobs: int, search_workers: int, chunk_size: int, tiers: str, partial_min_score: float, partial_top_k: int,
+           fuzzy_min_score: float, fuzzy_top_k: int, lexicon_dir: Path, roll_up: str, output_format: str, xlsx_max_rows: int,
+           stream: bool, stream_rows: int,
+           metrics_path: Path, log_metrics: bool, profile_path: Path, trace_memory: bool, incremental: bool,
+           previous_output: Path, work_dir: Path, resume: bool):
     """
     Search an ontology for matches to terms in a data file.
     :param ontology_id: The OBO identifier of the ontology.
     :param data_filename: The name of the file with terms to search for ontology matches.
+    :param sheets: The sheets to search, separated by commas, or 'all'.
+    :param columns: The columns to search, separated by commas, or 'all', the third column if None.
+    :param engine: The search engine to use, 'lexicon' or 'oak'.
+    :param use_cache: Whether to use the persistent match cache.
+    :param cache_path: Location of the match cache database.
+    :param cache_max_entries: Size limit of the match cache.
+    :param jobs: Number of worker processes, each searching one ontology at a time.
+    :param search_workers: Number of worker processes searching chunks of terms within one ontology.
+    :param chunk_size: Number of terms per search worker task.
+    :param tiers: The match tiers to search, separated by commas.
+    :param partial_min_score: Minimum fraction of the label or synonym covered by a PARTIAL match.
+    :param partial_top_k: Maximum number of PARTIAL matches per term.
+    :param fuzzy_min_score: Minimum similarity score of a FUZZY match.
+    :param fuzzy_top_k: Maximum number of FUZZY matches per term.
+    :param lexicon_dir: Directory of lexicon artifacts.
+    :param roll_up: The grouping classes, separated by commas, or a file listing them, None to not roll up.
+    :param output_format: Format of the output file, 'xlsx', 'csv', 'tsv' or 'parquet', that of the data file if None.
+    :param xlsx_max_rows: Rows per sheet of xlsx output.
+    :param stream: Whether to process the data file in chunks of rows.
+    :param stream_rows: Number of rows per chunk in streaming mode.
+    :param metrics_path: Location of the JSON metrics file, or None to not write one.
+    :param log_metrics: Whether to log the stage times and metrics.
+    :param profile_path: Location of the cProfile statistics, or None to not profile.
+    :param trace_memory: Whether to trace memory allocations.
+    :param incremental: Whether to reuse the results of a previous output.
+    :param previous_output: The previous output file, the latest one if None.
+    :param work_dir: Directory of the checkpoints.
+    :param resume: Whether to skip the work checkpointed by a failed attempt of the same run.
     """
+    from data_io import ALL, output_suffix
+    from incremental import PreviousRun, latest_output, run_settings, write_manifest
+
     oid = tuple(oid.split(',')) if oid else ()
+    sheets = ALL if sheets.strip().lower() == ALL else [sheet.strip() for sheet in sheets.split(',')]
+    if columns is not None:
+        columns = ALL if columns.strip().lower() == ALL else [column.strip() for column in columns.split(',')]
     filename_prefix = '_'.join(oid)
     output_data_directory = './data/output/'
 
@@ -187,92 +833,403 @@ def search(oid: tuple, data_filename: str):
     timestamp = datetime.now()
     formatted_timestamp = timestamp.strftime("%Y%m%d-%H%M%S")
 
+    file_path = Path(f'data/input/{data_filename}')
+    output_path = Path(f'{output_data_directory}{filename_prefix}-combined_ontology_annotations-{formatted_timestamp}{output_suffix(file_path, output_format)}')
+    if not use_cache:
+        cache_path = None
 
-    all_final_results_dict = {}
+    tiers = _parse_tiers(tiers, engine)
+    tier_options = {
+        'PARTIAL': {'min_score': partial_min_score, 'top_k': partial_top_k},
+        'FUZZY': {'min_score': fuzzy_min_score, 'top_k': fuzzy_top_k},
+    }
+    searcher_kwargs = dict(
+        engine=engine, cache_path=cache_path, cache_max_entries=cache_max_entries, search_workers=search_workers,
+        chunk_size=chunk_size, tiers=tiers, tier_options=tier_options, lexicon_dir=lexicon_dir,
+        roll_up=read_roll_up_terms(roll_up) if roll_up else ())
 
-    # Read in the data file
-    file_path = Path(f'data/input/{data_filename}')
-    xls = pd.ExcelFile(file_path)
-    # TODO: parameterize Sheet name variable?
-    data_df = pd.read_excel(xls, 'Sheet1') #condition_codes_v5
+    previous = None
+    if incremental:
+        if stream:
+            raise click.BadParameter("Incremental mode is not supported in streaming mode", param_hint='--incremental')
+        previous_output = previous_output or latest_output(output_data_directory, filename_prefix, output_path.suffix)
+        if previous_output is None:
+            logger.warning("No previous output found, all rows are searched")
+        else:
+            previous = PreviousRun(previous_output)
+
+    # Streaming runs are checkpointed per chunk of rows, other runs per ontology. The ontologies are only opened
+    # by the search, so each checkpoint records the ontology versions it was made with
+    checkpoint = RunCheckpoint(work_dir, file_path, dict(
+        oid=oid, sheets=sheets, columns=columns, settings=run_settings(engine, tiers, tier_options),
+        roll_up=searcher_kwargs['roll_up'],
+        stream_rows=stream_rows if stream else None,
+        previous_output=previous.output_path if previous is not None else None), resume)
+
+    metrics = RunMetrics(log_metrics)
+    try:
+        with profiling(metrics, profile_path, trace_memory):
+            if stream:
+                if jobs > 1:
+                    logger.warning("--jobs is ignored in streaming mode, ontologies are searched one chunk at a time")
+                _stream_search(oid, file_path, output_path, stream_rows, searcher_kwargs, metrics, checkpoint,
+                               sheets, columns, xlsx_max_rows)
+            else:
+                _batch_search(oid, file_path, output_path, jobs, searcher_kwargs, metrics, previous, checkpoint,
+                              sheets, columns, xlsx_max_rows)
+        # Record what the results depend on, for later incremental runs
+        write_manifest(output_path, run_settings(engine, tiers, tier_options), metrics.versions)
+        checkpoint.clear()
+    finally:
+        if log_metrics:
+            metrics.log_summary()
+        if metrics_path is not None:
+            metrics.write(metrics_path)
+
+
+def _record_output(metrics: RunMetrics, writer):
+    """
+    Add the size of the output file and the throughput of writing it to the metrics.
+    :param writer: The closed ChunkWriter of the output file.
+    """
+    seconds = metrics.stages.get('output', {}).get('seconds', 0.0)
+    megabytes = writer.bytes_written / 1e6
+    metrics.count('output.bytes', writer.bytes_written)
+    metrics.extra['output'] = {
+        'path': str(writer.file_path),
+        'rows': writer.rows_written,
+        'sheets': getattr(writer, 'sheets_written', None),
+        'megabytes': round(megabytes, 3),
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(writer.rows_written / seconds, 1) if seconds else None,
+        'megabytes_per_sec': round(megabytes / seconds, 3) if seconds else None,
+    }
+
+
+def _is_stacked(sheets, columns) -> bool:
+    """
+    :returns: Whether the cells of several sheets or columns are stacked to be searched together, see data_io.stack_cells.
+    """
+    return columns is not None or isinstance(sheets, str) or len(sheets) > 1
+
+
+def _batch_search(oid: tuple, file_path: Path, output_path: Path, jobs: int, searcher_kwargs: dict, metrics: RunMetrics,
+                  previous: Optional[PreviousRun] = None, checkpoint: Optional[RunCheckpoint] = None,
+                  sheets=('Sheet1',), columns=None, xlsx_max_rows: int = 1048575):
+    """
+    Harmonize a whole data file in memory.
+    :param oid: The OBO identifiers of the ontologies.
+    :param file_path: Path of the data file.
+    :param output_path: Path of the output file.
+    :param jobs: Number of worker processes, each searching one ontology at a time.
+    :param searcher_kwargs: Keyword arguments for OntologySearcher.
+    :param metrics: Metrics of the run.
+    :param previous: Optional output of a previous run to reuse the results of unchanged rows from.
+    :param checkpoint: Optional checkpoints of the run, the results of each ontology are saved as soon as it completes.
+    :param sheets: The sheets to search, or 'all'.
+    :param columns: The columns to search, 'all', or None for the third column.
+    :param xlsx_max_rows: Rows per sheet of xlsx output.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    from data_io import SEARCH_TERM_COLUMN, open_chunk_writer, read_input, read_sheets, stack_cells
+    from incremental import row_ids
+
+    ontology_results = {}
+
+    # Read in the data file, the workbook is read once for all sheets
+    term_column = None
+    with metrics.stage('read_input'):
+        if _is_stacked(sheets, columns):
+            data_df = stack_cells(read_sheets(file_path, sheets), columns)
+            term_column = SEARCH_TERM_COLUMN
+            logger.info(f"Searching {len(data_df)} cells of {data_df['sheet'].nunique()} sheets "
+                        f"and {data_df[['sheet', 'search_column']].drop_duplicates().shape[0]} columns")
+        else:
+            data_df = read_input(file_path, sheets[0])
     logger.debug(data_df.head())
     
-    # Add a new column 'UUID' with unique identifier values
-    # TODO: Add the UUID column if it does not already exist
-    data_df['UUID'] = data_df.apply(lambda row: generate_uuid(), axis=1)
+    # Add a new column 'UUID' with identifiers derived from the source columns, stable across runs
+    data_df['UUID'] = row_ids(data_df)
     logger.debug(data_df.nunique())
     logger.info("Number of total rows in dataframe: %s", len(data_df))
+    metrics.count('input.rows', len(data_df))
 
-    # Exact LABEL Search configuration
-    exact_label_search_config = SearchConfiguration(
-            properties=[SearchProperty.LABEL],
-            force_case_insensitive=True,
-        )
-    
-    # Exact LABEL and SYNONYM Search configuration
-    exact_label_synonym_search_config = SearchConfiguration(
-            properties=[SearchProperty.ALIAS],
-            force_case_insensitive=True,
-        )
+    # Skip the ontologies completed by an earlier attempt
+    pending = []
+    for ontology_id in oid:
+        saved = checkpoint.load(ontology_id) if checkpoint is not None else None
+        if saved is None:
+            pending.append(ontology_id)
+        else:
+            ontology_results[ontology_id] = saved['results']
+            metrics.versions[ontology_id] = saved['version']
+            metrics.count('checkpoint.ontologies_resumed')
 
+    def save_checkpoint(ontology_id: str):
+        if checkpoint is not None:
+            checkpoint.save(ontology_id, {'results': ontology_results[ontology_id],
+                                          'version': metrics.versions.get(ontology_id)})
 
-    for ontology_id in oid:
-        ontology_prefix = 'hpo' if ontology_id.lower() == 'hp' else ontology_id
+    if jobs > 1 and len(pending) > 1:
+        # Each ontology has its own SQLite database, so they can be searched in independent processes
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as executor:
+            futures = {
+                executor.submit(_harmonize_ontology_job, ontology_id, data_df, metrics.log,
+                                previous=previous, term_column=term_column, **searcher_kwargs): ontology_id
+                for ontology_id in pending
+            }
+            for future in as_completed(futures):
+                ontology_id = futures[future]
+                ontology_results[ontology_id], ontology_metrics = future.result()
+                metrics.merge(ontology_metrics)
+                save_checkpoint(ontology_id)
+    else:
+        for ontology_id in pending:
+            ontology_results[ontology_id] = harmonize_ontology(ontology_id, data_df, metrics=metrics, previous=previous,
+                                                               term_column=term_column, **searcher_kwargs)
+            save_checkpoint(ontology_id)
 
-        # Get the ontology
-        adapter = fetch_ontology(ontology_id)
+    # Combine in the order the ontologies were given so the output does not depend on which finishes first
+    all_final_results_dict = {ontology_id: ontology_results[ontology_id] for ontology_id in oid}
 
-        # Search for matching ontology terms to LABEL
-        exact_label_results_df = search_ontology(ontology_id, adapter, data_df, exact_label_search_config)
-        # Join exact_label_results_df back to original input data
-        overall_exact_label_results_df = pd.merge(data_df, exact_label_results_df, how='left', on='UUID')
-        # Clean up dataframe to remove original search columns
-        overall_exact_label_results_df = _clean_up_columns(overall_exact_label_results_df, ontology_id)
+    # Finally, combine all results and save to file!
+    combined_df = combine_results(data_df, all_final_results_dict, metrics)
 
-        # Filter out rows that have results to prepare for synonym search
-        filtered_df = overall_exact_label_results_df[overall_exact_label_results_df[f'{ontology_prefix}_result_match_type'].isnull()]
+    # Save combined results to file, xlsx files are streamed with a write-only workbook
+    with metrics.stage('output'):
+        writer = open_chunk_writer(output_path, DICTIONARY_COLUMNS, xlsx_max_rows)
+        writer.write(combined_df)
+        writer.close()
+    metrics.count('output.rows', len(combined_df))
+    _record_output(metrics, writer)
 
-        # Search for matching terms to SYNONYM
-        overall_exact_synonym_results_df = search_ontology(ontology_id, adapter, filtered_df, exact_label_synonym_search_config)
-        # Join overall_exact_synonym_results_df back to overall_results_df
-        overall_final_results_df = pd.merge(overall_exact_label_results_df, overall_exact_synonym_results_df, how='left', on='UUID')
-        # Clean up dataframe to remove original search columns
-        overall_final_results_df = _clean_up_columns(overall_final_results_df, ontology_id)
 
-        # Save ontology search results to a dict
-        all_final_results_dict[ontology_id] = overall_final_results_df
+def _stream_search(oid: tuple, file_path: Path, output_path: Path, stream_rows: int, searcher_kwargs: dict,
+                   metrics: Optional[RunMetrics] = None, checkpoint: Optional[RunCheckpoint] = None,
+                   sheets=('Sheet1',), columns=None, xlsx_max_rows: int = 1048575):
+    """
+    Harmonize a data file chunk by chunk, appending the results of each chunk to the output file,
+    so memory use does not depend on the size of the data file.
+    :param oid: The OBO identifiers of the ontologies.
+    :param file_path: Path of the data file.
+    :param output_path: Path of the output file.
+    :param stream_rows: Number of rows per chunk.
+    :param searcher_kwargs: Keyword arguments for OntologySearcher.
+    :param metrics: Optional metrics of the run, the stages accumulate over the chunks.
+    :param checkpoint: Optional checkpoints of the run, the results of each chunk are saved once it is harmonized.
+        The output file is rewritten from the start, with the saved results of the chunks completed earlier.
+    :param sheets: The sheets to search, or 'all'. Each sheet is read in chunks of rows, one after the other.
+    :param columns: The columns to search, 'all', or None for the third column.
+    :param xlsx_max_rows: Rows per sheet of xlsx output.
+    """
+    from collections import Counter
 
+    from data_io import SEARCH_TERM_COLUMN, iter_input_chunks, open_chunk_writer, resolve_sheets, stack_cells
+    from incremental import row_ids
 
+    def iter_chunks():
+        for sheet in resolve_sheets(file_path, sheets):
+            for sheet_chunk_df in iter_input_chunks(file_path, stream_rows, sheet):
+                yield stack_cells({sheet: sheet_chunk_df}, columns) if stacked else sheet_chunk_df
 
-    # Finally, combine all results and save to file!
-    # Concatenate all DataFrames into a single DataFrame
-    result_df = pd.concat(all_final_results_dict.values(), ignore_index=True)
+    stacked = _is_stacked(sheets, columns)
+    term_column = SEARCH_TERM_COLUMN if stacked else None
 
-    # Replace NaN values with empty string
-    df_cleaned = result_df.fillna('')
+    metrics = metrics or RunMetrics()
+    # Every ontology is opened once, when the first chunk is searched, and reused for all chunks
+    searchers = {ontology_id: OntologySearcher(ontology_id, metrics=metrics, **searcher_kwargs) for ontology_id in oid}
+    writer = open_chunk_writer(output_path, DICTIONARY_COLUMNS, xlsx_max_rows)
+    # Occurrences of each row ID hash in the chunks read so far, identical rows are numbered across chunks
+    seen_row_ids = Counter()
+    # Ontology versions of the chunks harmonized by an earlier attempt
+    resumed_versions = {}
+    try:
+        chunks = iter_chunks()
+        chunk_index = 0
+        while True:
+            with metrics.stage('read_input'):
+                chunk_df = next(chunks, None)
+            if chunk_df is None:
+                break
+            metrics.count('input.rows', len(chunk_df))
+            chunk_name = f'chunk-{chunk_index:06d}'
+            chunk_index += 1
+            # Chunks harmonized by an earlier attempt are still read, to keep the chunk boundaries and row IDs
+            chunk_df['UUID'] = row_ids(chunk_df, seen_row_ids)
+            saved = checkpoint.load(chunk_name) if checkpoint is not None else None
+            if saved is None:
+                all_final_results_dict = {
+                    ontology_id: searcher.search(chunk_df, term_column) for ontology_id, searcher in searchers.items()
+                }
+                combined_df = combine_results(chunk_df, all_final_results_dict, metrics)
+                versions = {ontology_id: searcher.ontology_version for ontology_id, searcher in searchers.items()}
+                # The output must not mix the results of two versions of an ontology
+                changed = [ontology_id for ontology_id, version in resumed_versions.items()
+                           if versions[ontology_id] != version]
+                if changed:
+                    raise click.ClickException(f"{', '.join(changed)} changed since the checkpoints at "
+                                               f"{checkpoint.path} were saved, rerun without --resume")
+                if checkpoint is not None:
+                    checkpoint.save(chunk_name, {'results': combined_df, 'versions': versions})
+            else:
+                combined_df = saved['results']
+                resumed_versions.update(saved['versions'])
+                metrics.versions.update(saved['versions'])
+                metrics.count('checkpoint.chunks_resumed')
+            with metrics.stage('output'):
+                writer.write(combined_df)
+            metrics.count('output.rows', len(combined_df))
+            logger.info(f"Harmonized {writer.rows_written} rows")
+    finally:
+        with metrics.stage('output'):
+            writer.close()
+        _record_output(metrics, writer)
+        for searcher in searchers.values():
+            searcher.close()
 
-    # Define a custom aggregation function to join non-empty values
-    def custom_join(series):
-        non_empty_values = [value for value in series if value != '']
-        return ', '.join(non_empty_values)
-    
 
-    # Add columns dynamically to the "agg" function _if_ they exist within the dataframe
-    columns_to_groupby = ['UUID', 'study', 'source_column', 'source_column_value', 'conditionMeasureSourceText']
-    columns_to_agg = [col for col in df_cleaned.columns if col in [
-        'hpoLabel', 'hpoCode', 'hpo_result_match_type',
-        'mondoLabel', 'mondoCode', 'mondo_result_match_type', 
-        'maxoLabel', 'maxoCode', 'maxo_result_match_type',
-        'otherLabel', 'otherCode', 'Trish Notes']
-    ]
+@main.command("serve")
+@click.option('--oid', '-o', required=True, help='Ontology IDs to serve, separated by commas')
+@click.option('--engine', type=click.Choice(['lexicon', 'oak']), default='lexicon', show_default=True,
+              help='Match with an in-memory index of labels and synonyms, or with per-term OAK basic_search queries')
+@click.option('--tiers', default=','.join(DEFAULT_TIERS), show_default=True,
+              help=f'Match tiers separated by commas, in order of preference, from: {", ".join(MATCH_TIERS)}')
+@click.option('--partial-min-score', type=click.FloatRange(0, 1), default=SCORED_TIERS['PARTIAL']['min_score'], show_default=True)
+@click.option('--partial-top-k', type=click.IntRange(min=1), default=SCORED_TIERS['PARTIAL']['top_k'], show_default=True)
+@click.option('--fuzzy-min-score', type=click.FloatRange(0, 1), default=SCORED_TIERS['FUZZY']['min_score'], show_default=True)
+@click.option('--fuzzy-top-k', type=click.IntRange(min=1), default=SCORED_TIERS['FUZZY']['top_k'], show_default=True)
+@click.option('--lexicon-dir', type=click.Path(path_type=Path), default=DEFAULT_LEXICON_DIR, show_default=True,
+              help='Directory of lexicon artifacts made by build-lexicon, used instead of the ontology database when present')
+@click.option('--host', default='127.0.0.1', show_default=True, help='Interface to listen on')
+@click.option('--port', type=click.IntRange(min=0, max=65535), default=8000, show_default=True, help='Port to listen on')
+def serve(oid: str, engine: str, tiers: str, partial_min_score: float, partial_top_k: int, fuzzy_min_score: float,
+          fuzzy_top_k: int, lexicon_dir: Path, host: str, port: int):
+    """
+    Keep ontologies open and match batches of terms sent to a local HTTP/JSON API.
+    :param oid: The OBO identifiers of the ontologies, separated by commas.
+    :param engine: The search engine to use, 'lexicon' or 'oak'.
+    :param tiers: The match tiers to search, separated by commas.
+    :param lexicon_dir: Directory of lexicon artifacts.
+    :param host: Interface to listen on.
+    :param port: Port to listen on.
+    """
+    from service import HarmonizationService, make_server
 
-    # Perform the groupby and aggregation
-    agg_dict = {col: custom_join for col in columns_to_agg}
-    combined_df = df_cleaned.groupby(columns_to_groupby).agg(agg_dict).reset_index()
+    tiers = _parse_tiers(tiers, engine)
+    tier_options = {
+        'PARTIAL': {'min_score': partial_min_score, 'top_k': partial_top_k},
+        'FUZZY': {'min_score': fuzzy_min_score, 'top_k': fuzzy_top_k},
+    }
+    # The match cache is left out, its SQLite connection cannot be shared by the request threads
+    # and the warm in-memory indexes answer faster than a cache lookup
+    searchers = {}
+    for ontology_id in oid.split(','):
+        searchers[ontology_id] = OntologySearcher(ontology_id, engine, tiers=tiers, tier_options=tier_options,
+                                                  lexicon_dir=lexicon_dir)
+        searchers[ontology_id].warm()
+
+    server = make_server(HarmonizationService(searchers), host, port)
+    click.echo(f"Serving {', '.join(searchers)} on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for searcher in searchers.values():
+            searcher.close()
 
 
-    # Save combined results to file
-    combined_df.to_excel(f'{output_data_directory}{filename_prefix}-combined_ontology_annotations-{formatted_timestamp}.xlsx', index=False)
+@main.command("build-lexicon")
+@click.option('--oid', '-o', required=True, help='Ontology IDs separated by commas')
+@click.option('--lexicon-dir', type=click.Path(path_type=Path), default=DEFAULT_LEXICON_DIR, show_default=True)
+def build_lexicon(oid: str, lexicon_dir: Path):
+    """
+    Compile the labels and synonyms of ontologies into memory-mappable lexicon artifacts used by search.
+    :param oid: The OBO identifiers of the ontologies, separated by commas.
+    :param lexicon_dir: Directory to write the lexicon artifacts to.
+    """
+    from lexicon_artifact import artifact_path, build_lexicon_artifact
+
+    for ontology_id in oid.split(','):
+        # Stamp the artifact with the cached database, not a prepared copy
+        adapter = fetch_ontology(ontology_id, prepared_dir=None)
+        path = build_lexicon_artifact(ontology_id, adapter_db_path(adapter), artifact_path(lexicon_dir, ontology_id),
+                                      get_ontology_version(adapter))
+        click.echo(f"{ontology_id}: {path}")
+
+
+@main.command("prepare-db")
+@click.option('--oid', '-o', required=True, help='Ontology IDs separated by commas')
+@click.option('--in-place', is_flag=True, default=False,
+              help=f'Add the indexes to the cached database in ~/.data/oaklib instead of a copy in {DEFAULT_PREPARED_DIR}')
+@click.option('--sample-size', type=click.IntRange(min=1), default=50, show_default=True,
+              help='Number of labels searched to time each search configuration')
+@click.option('--report', 'report_path', type=click.Path(path_type=Path), default=None,
+              help='Write the query plans and timings before and after to this JSON file')
+def prepare_database(oid: str, in_place: bool, sample_size: int, report_path: Path):
+    """
+    Add case-insensitive search indexes to the databases of ontologies, used by the oak engine and label lookups.
+    :param oid: The OBO identifiers of the ontologies, separated by commas.
+    :param in_place: Whether to modify the cached databases instead of preparing copies.
+    :param sample_size: Number of labels searched for the timings.
+    :param report_path: Location of the JSON report, or None to only print the summary.
+    """
+    reports = []
+    for ontology_id in oid.split(','):
+        db_path = adapter_db_path(fetch_ontology(ontology_id, prepared_dir=None))
+        report = prepare_db(ontology_id, db_path, None if in_place else DEFAULT_PREPARED_DIR, sample_size)
+        reports.append(report)
+        click.echo(f"{ontology_id}: {report['database']}, created {', '.join(report['indexes_created']) or 'no new indexes'}")
+        for search_name in report['before']:
+            before, after = report['before'][search_name], report['after'][search_name]
+            click.echo(f"  {search_name}: {before['seconds']:.3f} s -> {after['seconds']:.3f} s for {after['queries']} queries")
+            click.echo(f"    before: {'; '.join(before['plan'])}")
+            click.echo(f"    after:  {'; '.join(after['plan'])}")
+    if report_path is not None:
+        report_path.write_text(json.dumps(reports, indent=2) + '\n')
+
+
+@main.group("cache")
+def cache_group():
+    """
+    Inspect or clear the persistent match cache.
+    """
+
+
+@cache_group.command("stats")
+@click.option('--cache-path', type=click.Path(path_type=Path), default=DEFAULT_CACHE_PATH, show_default=True)
+def cache_stats(cache_path: Path):
+    """
+    Show the number of cached terms per ontology version and match tier.
+    :param cache_path: Location of the match cache database.
+    """
+    import pandas as pd
+
+    match_cache = MatchCache(cache_path)
+    stats = match_cache.stats()
+    match_cache.close()
+    click.echo(f"Cache file: {cache_path} ({cache_path.stat().st_size / 1e6:.1f} MB)")
+    if stats:
+        click.echo(pd.DataFrame(stats).to_string(index=False))
+    else:
+        click.echo("Cache is empty")
+
+
+@cache_group.command("clear")
+@click.option('--cache-path', type=click.Path(path_type=Path), default=DEFAULT_CACHE_PATH, show_default=True)
+@click.option('--oid', '-o', help='Only clear entries of this ontology ID')
+def cache_clear(cache_path: Path, oid: str):
+    """
+    Delete cached search results.
+    :param cache_path: Location of the match cache database.
+    :param oid: Optional ontology ID to restrict the deletion to.
+    """
+    match_cache = MatchCache(cache_path)
+    deleted = match_cache.clear(oid)
+    match_cache.close()
+    click.echo(f"Deleted {deleted} cached entries")
 
 
 @main.command("hello")
@@ -0,0 +1,160 @@
+"""
+Stable row IDs and reuse of the results of a previous run, so that only new or changed rows are searched again.
+
+Every output file gets a manifest next to it with the ontology versions and search settings of the run.
+The results of a previous output are reused for an ontology only when both are unchanged.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import numbers
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+from data_io import ALL, CELL_COLUMNS, read_sheets
+
+__all__ = [
+    "ROW_ID_COLUMNS",
+    "PreviousRun",
+    "latest_output",
+    "row_ids",
+    "run_settings",
+    "write_manifest",
+]
+
+logger = logging.getLogger("harmonize.incremental")
+
+# Source columns identifying a row of the data file
+ROW_ID_COLUMNS = ['study', 'source_column', 'source_column_value', 'conditionMeasureSourceText']
+
+
+def _cell_text(value) -> str:
+    """
+    :returns: The text of a cell as hashed in row IDs, the same whichever reader typed it, e.g. '1' for the
+        1.0 of pandas and the 1 of openpyxl or a CSV file, and '' for an empty cell.
+    """
+    if value is None or value is pd.NA or value is pd.NaT:
+        return ''
+    if isinstance(value, numbers.Integral) and not isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, numbers.Real) and not isinstance(value, bool):
+        value = float(value)
+        if math.isnan(value):
+            return ''
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+def row_ids(df: pd.DataFrame, seen: Optional[Counter] = None) -> pd.Series:
+    """
+    Derive deterministic row IDs from the content of the source columns, the same for the same row in every run.
+    Identical rows get the ID of their content with the number of earlier occurrences appended, e.g. '<hash>-1'.
+    The cells stacked from several sheets and columns are identified by their sheet and column too.
+    Cells are hashed as text, with numbers written the same whichever reader typed them, see _cell_text.
+    :param df: Dataframe of the data file, or of its stacked cells, see data_io.stack_cells.
+    :param seen: Occurrences of each content hash in the earlier chunks of the same data file, updated with those
+        of this chunk, so that identical rows in different chunks get different IDs. None for a whole data file.
+    :returns: The row IDs, aligned with the dataframe.
+    """
+    columns = [column for column in ROW_ID_COLUMNS if column in df.columns] or \
+        [column for column in df.columns if column not in CELL_COLUMNS and column != 'UUID']
+    columns += [column for column in CELL_COLUMNS if column in df.columns]
+    hashes = pd.Series([
+        hashlib.blake2b('\x1f'.join(map(_cell_text, row)).encode('utf-8'), digest_size=16).hexdigest()
+        for row in df[columns].itertuples(index=False, name=None)
+    ], index=df.index)
+    occurrences = hashes.groupby(hashes).cumcount()
+    if seen is not None:
+        occurrences += [seen[row_hash] for row_hash in hashes]
+        seen.update(hashes)
+    return hashes.where(occurrences == 0, hashes + '-' + occurrences.astype(str))
+
+
+def run_settings(engine: str, tiers: Iterable[str], tier_options: Optional[Dict[str, dict]]) -> dict:
+    """
+    :returns: The search settings that change the results of a run, as stored in the manifest.
+    """
+    return json.loads(json.dumps({'engine': engine, 'tiers': list(tiers), 'tier_options': tier_options or {}}))
+
+
+def _manifest_path(output_path: Path) -> Path:
+    return output_path.with_name(f'{output_path.name}.manifest.json')
+
+
+def write_manifest(output_path: Path, settings: dict, versions: Dict[str, Optional[str]]):
+    """
+    Record the search settings and ontology versions of the run next to its output file.
+    :param output_path: Path of the output file.
+    :param settings: The search settings, see run_settings.
+    :param versions: The owl:versionIRI of each searched ontology.
+    """
+    _manifest_path(output_path).write_text(json.dumps({'settings': settings, 'versions': versions}, indent=2) + '\n')
+
+
+def latest_output(output_dir: Path, filename_prefix: str, suffix: str) -> Optional[Path]:
+    """
+    :returns: The most recent output file of the same ontologies and format, or None if there is none.
+    """
+    # The timestamp in the file names sorts chronologically
+    outputs = sorted(Path(output_dir).glob(f'{filename_prefix}-combined_ontology_annotations-*{suffix}'))
+    return outputs[-1] if outputs else None
+
+
+class PreviousRun:
+    """
+    The output file and manifest of a previous run.
+    """
+
+    def __init__(self, output_path: Path):
+        """
+        :param output_path: Path of the previous output file.
+        """
+        self.output_path = Path(output_path)
+        manifest_path = _manifest_path(self.output_path)
+        self.manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+        if not self.manifest:
+            logger.warning(f"No manifest found for {self.output_path}, all rows are searched again")
+        # Large xlsx outputs continue on further sheets
+        self.df = pd.concat(read_sheets(self.output_path, ALL).values(), ignore_index=True).fillna('').astype(str)
+        self.row_ids = set(self.df['UUID']) if 'UUID' in self.df.columns else set()
+        logger.info(f"Previous output {self.output_path}: {len(self.df)} rows")
+
+    def is_reusable(self, ontology_id: str, version: Optional[str], settings: dict) -> bool:
+        """
+        :param ontology_id: The OBO identifier of the ontology.
+        :param version: The owl:versionIRI of the ontology in this run.
+        :param settings: The search settings of this run, see run_settings.
+        :returns: Whether the previous results of the ontology are still valid.
+        """
+        if not version or not self.row_ids or self.manifest.get('settings') != settings:
+            return False
+        previous_version = self.manifest.get('versions', {}).get(ontology_id)
+        if previous_version != version:
+            logger.info(f"{ontology_id} changed from {previous_version} to {version}, all rows are searched again")
+            return False
+        return True
+
+    def search_results(self, ontology_id: str, uuids: pd.Series) -> pd.DataFrame:
+        """
+        :param ontology_id: The OBO identifier of the ontology.
+        :param uuids: The row IDs of this run, rows not in it are left out.
+        :returns: The previous search result columns of the ontology for the matched rows, like search_ontology.
+        """
+        ontology_prefix = 'hpo' if ontology_id.lower() == 'hp' else ontology_id
+        columns = {
+            'UUID': 'UUID',
+            f'{ontology_prefix}Code': f'{ontology_prefix}_result_curie',
+            f'{ontology_prefix}Label': f'{ontology_prefix}_result_label',
+            f'{ontology_prefix}_result_match_type': f'{ontology_prefix}_result_match_type',
+            f'{ontology_prefix}_result_score': f'{ontology_prefix}_result_score',
+        }
+        columns = {column: result_column for column, result_column in columns.items() if column in self.df.columns}
+        if f'{ontology_prefix}_result_match_type' not in columns:
+            return pd.DataFrame(columns=list(columns.values()))
+        is_matched = (self.df[f'{ontology_prefix}_result_match_type'] != '') & self.df['UUID'].isin(uuids)
+        return self.df.loc[is_matched, list(columns)].rename(columns=columns).reset_index(drop=True)
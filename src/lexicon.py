@@ -0,0 +1,216 @@
+"""
+In-memory lexical index over the labels and synonyms of a semsql ontology database.
+"""
+
+import logging
+import math
+import sqlite3
+from collections import defaultdict
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from semsql_db import adapter_db_path
+
+if TYPE_CHECKING:
+    from fuzzy_index import TrigramIndex
+    from token_index import TokenIndex
+
+__all__ = [
+    "DEFAULT_LEXICON_DIR",
+    "LABEL_PREDICATE",
+    "Lexicon",
+    "SYNONYM_PREDICATES",
+    "normalize_term",
+    "read_statements",
+]
+
+logger = logging.getLogger("harmonize.lexicon")
+
+# Directory of the lexicon artifacts made by build-lexicon, see lexicon_artifact
+DEFAULT_LEXICON_DIR = Path.home() / ".data" / "harmonica" / "lexicons"
+
+LABEL_PREDICATE = "rdfs:label"
+
+# Mirrors oaklib.datamodels.vocabulary.SYNONYM_PREDICATES, i.e. what OAK searches for SearchProperty.ALIAS
+SYNONYM_PREDICATES = (
+    "oio:hasRelatedSynonym",
+    "oio:hasNarrowSynonym",
+    "oio:hasExactSynonym",
+    "oio:hasBroadSynonym",
+    "skos:altLabel",
+    "IAO:0000118",
+)
+
+
+def normalize_term(term) -> Optional[str]:
+    """
+    Normalize a search term or ontology string for exact matching.
+    Matching is case insensitive, like the SQL LIKE used by OAK with force_case_insensitive.
+    :param term: The value to normalize.
+    :returns: The normalized string, or None for empty/missing values.
+    """
+    if term is None or (isinstance(term, float) and math.isnan(term)):
+        return None
+    normalized = str(term).strip().lower()
+    return normalized or None
+
+
+def read_statements(db_path: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Read the labels and synonyms of all named entities from a semsql SQLite database in one bulk scan.
+    :param db_path: Path to the semsql SQLite database file.
+    :returns: Iterator of (subject CURIE, predicate, literal value).
+    """
+    predicates = (LABEL_PREDICATE,) + SYNONYM_PREDICATES
+    query = (
+        "SELECT subject, predicate, value FROM statements "
+        f"WHERE predicate IN ({','.join('?' * len(predicates))}) "
+        "AND value IS NOT NULL AND subject NOT LIKE '\\_:%' ESCAPE '\\'"
+    )
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        yield from connection.execute(query, predicates)
+    finally:
+        connection.close()
+
+
+class Lexicon:
+    """
+    Exact-match index of the labels and synonyms of one ontology, built from a single
+    bulk scan of the semsql `statements` table.
+    """
+
+    def __init__(self, ontology_id: str, statements: Iterable[Tuple[str, str, str]]):
+        """
+        :param ontology_id: The OBO identifier of the ontology.
+        :param statements: Tuples of (subject CURIE, predicate, literal value).
+        """
+        self.ontology_id = ontology_id
+        self.labels: Mapping[str, str] = {}
+        self.label_index: Mapping[str, List[str]] = defaultdict(list)
+        self.synonym_index: Mapping[str, List[str]] = defaultdict(list)
+
+        for subject, predicate, value in statements:
+            normalized = normalize_term(value)
+            if normalized is None:
+                continue
+            if predicate == LABEL_PREDICATE:
+                self.labels.setdefault(subject, value)
+                self.label_index[normalized].append(subject)
+            else:
+                self.synonym_index[normalized].append(subject)
+
+        # Convert to plain dicts so lookups of unknown terms do not grow the index
+        self.label_index = dict(self.label_index)
+        self.synonym_index = dict(self.synonym_index)
+        self._fuzzy_index: Optional["TrigramIndex"] = None
+        self._token_index: Optional["TokenIndex"] = None
+        logger.info(f"Lexicon for {ontology_id}: {len(self.labels)} labels, {len(self.synonym_index)} distinct synonyms")
+
+    @classmethod
+    def from_semsql(cls, ontology_id: str, db_path: str) -> "Lexicon":
+        """
+        Build the lexicon from a semsql SQLite database.
+        :param ontology_id: The OBO identifier of the ontology.
+        :param db_path: Path to the semsql SQLite database file.
+        """
+        return cls(ontology_id, read_statements(db_path))
+
+    @classmethod
+    def from_indexes(cls, ontology_id: str, labels: Mapping[str, str], label_index: Mapping[str, List[str]],
+                     synonym_index: Mapping[str, List[str]]) -> "Lexicon":
+        """
+        Wrap prebuilt indexes, e.g. the views of a memory-mapped lexicon artifact.
+        :param ontology_id: The OBO identifier of the ontology.
+        :param labels: Mapping of CURIE to label.
+        :param label_index: Mapping of normalized label to CURIEs.
+        :param synonym_index: Mapping of normalized synonym to CURIEs.
+        """
+        lexicon = cls.__new__(cls)
+        lexicon.ontology_id = ontology_id
+        lexicon.labels, lexicon.label_index, lexicon.synonym_index = labels, label_index, synonym_index
+        lexicon._fuzzy_index, lexicon._token_index = None, None
+        return lexicon
+
+    @classmethod
+    def from_adapter(cls, ontology_id: str, adapter) -> "Lexicon":
+        """
+        Build the lexicon from the database behind an OAK SqlImplementation.
+        :param ontology_id: The OBO identifier of the ontology.
+        :param adapter: The connector to the ontology database.
+        """
+        return cls.from_semsql(ontology_id, adapter_db_path(adapter))
+
+    def lookup(self, term, search_property: str = "LABEL") -> List[str]:
+        """
+        Find the CURIEs whose label (or label and synonyms) match a term exactly.
+        :param term: The term to search for.
+        :param search_property: 'LABEL' for labels only, 'ALIAS' for labels and synonyms.
+        :returns: Sorted list of matching CURIEs.
+        """
+        normalized = normalize_term(term)
+        if normalized is None:
+            return []
+        curies = set(self.label_index.get(normalized, ()))
+        if search_property == "ALIAS":
+            curies.update(self.synonym_index.get(normalized, ()))
+        return sorted(curies)
+
+    def label(self, curie: str) -> Optional[str]:
+        """
+        :param curie: The identifier of the ontology term.
+        :returns: The rdfs:label of the term, if any.
+        """
+        return self.labels.get(curie)
+
+    def _strings(self) -> List[str]:
+        """
+        :returns: All distinct normalized labels and synonyms, sorted.
+        """
+        return sorted(self.label_index.keys() | self.synonym_index.keys())
+
+    def _curie_scores(self, terms: List[str], string_matches: Dict[str, List[Tuple[str, float]]],
+                      top_k: int) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Expand the labels and synonyms matched to each term into the CURIEs carrying them.
+        :returns: Dict of term to list of (curie, best score over its matched strings), best first, for every term.
+        """
+        term_curies = {}
+        for term in terms:
+            curie_scores = {}
+            for string, score in string_matches.get(term, ()):
+                for curie in self.label_index.get(string, []) + self.synonym_index.get(string, []):
+                    curie_scores[curie] = max(score, curie_scores.get(curie, 0))
+            term_curies[term] = sorted(curie_scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        return term_curies
+
+    def fuzzy_lookup(self, terms: Iterable[str], min_score: float = 0.8, top_k: int = 3) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Find the CURIEs whose label or synonyms are closest to each term by edit distance.
+        The trigram index over all labels and synonyms is built on first use.
+        :param terms: Normalized terms to search.
+        :param min_score: Minimum similarity score of a match, between 0 and 1.
+        :param top_k: Maximum number of CURIEs per term.
+        :returns: Dict of term to list of (curie, score), best first, for every term.
+        """
+        if self._fuzzy_index is None:
+            from fuzzy_index import TrigramIndex
+            self._fuzzy_index = TrigramIndex(self._strings())
+        terms = list(terms)
+        return self._curie_scores(terms, self._fuzzy_index.search(terms, min_score, top_k), top_k)
+
+    def partial_lookup(self, terms: Iterable[str], min_score: float = 0.5, top_k: int = 3) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Find the CURIEs with a label or synonym containing every word of a term, each word matching the start
+        of a word, e.g. 'ureteroc' matches 'ureterocele'.
+        The token index over all labels and synonyms is built on first use.
+        :param terms: Normalized terms to search.
+        :param min_score: Minimum fraction of the label or synonym covered by the term, between 0 and 1.
+        :param top_k: Maximum number of CURIEs per term.
+        :returns: Dict of term to list of (curie, score), best first, for every term.
+        """
+        if self._token_index is None:
+            from token_index import TokenIndex
+            self._token_index = TokenIndex(self._strings())
+        terms = list(terms)
+        return self._curie_scores(terms, self._token_index.search(terms, min_score, top_k), top_k)
@@ -0,0 +1,297 @@
+"""
+Precompiled, memory-mappable form of the lexicon of an ontology.
+
+The artifact is a single file: a JSON header followed by numpy arrays. Strings are stored in sorted
+string tables (UTF-8 bytes plus an offset array), so lookups are binary searches over the mapped pages,
+and concurrent processes opening the same artifact share them through the OS page cache.
+"""
+
+import json
+import logging
+import os
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from lexicon import DEFAULT_LEXICON_DIR, LABEL_PREDICATE, SYNONYM_PREDICATES, Lexicon, normalize_term, read_statements
+
+__all__ = [
+    "DEFAULT_LEXICON_DIR",
+    "artifact_path",
+    "build_lexicon_artifact",
+    "open_lexicon_artifact",
+]
+
+logger = logging.getLogger("harmonize.lexicon_artifact")
+
+MAGIC = b"HARMONICA-LEXICON-1\n"
+# Arrays start at multiples of this many bytes
+ALIGNMENT = 64
+
+# Predicate code of each entry: 0 for labels, 1 and up for the synonym predicates
+PREDICATES = (LABEL_PREDICATE,) + SYNONYM_PREDICATES
+
+
+def artifact_path(lexicon_dir: Path, ontology_id: str) -> Path:
+    """
+    :returns: The location of the lexicon artifact of an ontology.
+    """
+    return Path(lexicon_dir) / f"{ontology_id.lower()}.lexicon"
+
+
+def _string_table(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :returns: (UTF-8 bytes of all strings, offsets of each string with the end offset last)
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _source_stamp(db_path: str) -> Dict:
+    """
+    :returns: The size and modification time of the semsql database, to detect stale artifacts.
+    """
+    stat = os.stat(db_path)
+    return {"path": str(db_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def build_lexicon_artifact(ontology_id: str, db_path: str, path: Path, version: Optional[str]) -> Path:
+    """
+    Compile the labels and synonyms of an ontology into a lexicon artifact.
+    :param ontology_id: The OBO identifier of the ontology.
+    :param db_path: Path to the semsql SQLite database file.
+    :param path: Location of the artifact file to write.
+    :param version: The owl:versionIRI of the ontology, stamped on the artifact.
+    :returns: The path of the written artifact.
+    """
+    labels: Dict[str, str] = {}
+    # Normalized term to (curie, predicate code) entries in statement order, like the Lexicon indexes
+    term_entries = defaultdict(list)
+    predicate_codes = {predicate: code for code, predicate in enumerate(PREDICATES)}
+    for subject, predicate, value in read_statements(db_path):
+        normalized = normalize_term(value)
+        if normalized is None:
+            continue
+        if predicate == LABEL_PREDICATE:
+            labels.setdefault(subject, value)
+        term_entries[normalized].append((subject, predicate_codes[predicate]))
+
+    curies = sorted(labels.keys() | {curie for entries in term_entries.values() for curie, _ in entries})
+    curie_ids = {curie: curie_id for curie_id, curie in enumerate(curies)}
+    # Sorting str by code point gives the same order as sorting their UTF-8 bytes
+    terms = sorted(term_entries)
+
+    entry_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(term_entries[term]) for term in terms], out=entry_offsets[1:])
+    entries = [entry for term in terms for entry in term_entries[term]]
+
+    arrays = {}
+    arrays["curie_data"], arrays["curie_offsets"] = _string_table(curies)
+    arrays["label_data"], arrays["label_offsets"] = _string_table([labels.get(curie, "") for curie in curies])
+    arrays["term_data"], arrays["term_offsets"] = _string_table(terms)
+    arrays["entry_offsets"] = entry_offsets
+    arrays["entry_curies"] = np.array([curie_ids[curie] for curie, _ in entries], dtype=np.int32)
+    arrays["entry_predicates"] = np.array([code for _, code in entries], dtype=np.int8)
+
+    # Lay out the arrays after the header, each aligned for its dtype
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        layout[name] = {"dtype": array.dtype.str, "length": len(array), "offset": offset}
+        offset += array.nbytes
+    header = json.dumps({
+        "ontology_id": ontology_id,
+        "version": version,
+        "source": _source_stamp(db_path),
+        "predicates": PREDICATES,
+        "arrays": layout,
+    }).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, so concurrent readers never map a partial artifact
+    temporary_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(temporary_path, "wb") as artifact:
+        artifact.write(MAGIC)
+        artifact.write(len(header).to_bytes(8, "little"))
+        artifact.write(header)
+        for name, array in arrays.items():
+            artifact.seek(data_start + layout[name]["offset"])
+            artifact.write(array.tobytes())
+    os.replace(temporary_path, path)
+    logger.info(f"Lexicon artifact for {ontology_id}: {len(curies)} ids, {len(terms)} terms, written to {path}")
+    return path
+
+
+class _StringTable:
+    """
+    Sorted strings in a mapped UTF-8 buffer, decoded on access.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return self._data[self._offsets[index]:self._offsets[index + 1]].tobytes().decode("utf-8")
+
+    def find(self, string: str) -> int:
+        """
+        :returns: The index of the string by binary search, -1 if it is not in the table.
+        """
+        index = bisect_left(self, string)
+        return index if index < len(self) and self[index] == string else -1
+
+
+class _TermIndex(Mapping):
+    """
+    Read-only view of the artifact as a dict of normalized term to CURIEs, for labels or for synonyms.
+    """
+
+    def __init__(self, artifact: "LexiconArtifact", synonyms: bool):
+        self._artifact = artifact
+        self._synonyms = synonyms
+        is_synonym = artifact.entry_predicates != 0
+        entry_terms = np.repeat(np.arange(len(artifact.terms)), np.diff(artifact.entry_offsets))
+        self._has_entries = np.zeros(len(artifact.terms), dtype=bool)
+        self._has_entries[entry_terms[is_synonym if synonyms else ~is_synonym]] = True
+
+    def __getitem__(self, term: str) -> List[str]:
+        term_id = self._artifact.terms.find(term)
+        if term_id < 0 or not self._has_entries[term_id]:
+            raise KeyError(term)
+        entries = slice(self._artifact.entry_offsets[term_id], self._artifact.entry_offsets[term_id + 1])
+        is_synonym = self._artifact.entry_predicates[entries] != 0
+        curie_ids = self._artifact.entry_curies[entries][is_synonym if self._synonyms else ~is_synonym]
+        return [self._artifact.curies[curie_id] for curie_id in curie_ids]
+
+    def __iter__(self) -> Iterator[str]:
+        for term_id in np.flatnonzero(self._has_entries):
+            yield self._artifact.terms[term_id]
+
+    def __len__(self) -> int:
+        return int(self._has_entries.sum())
+
+
+class _LabelIndex(Mapping):
+    """
+    Read-only view of the artifact as a dict of CURIE to label.
+    """
+
+    def __init__(self, artifact: "LexiconArtifact"):
+        self._artifact = artifact
+
+    def __getitem__(self, curie: str) -> str:
+        curie_id = self._artifact.curies.find(curie)
+        label = self._artifact.labels[curie_id] if curie_id >= 0 else ""
+        if not label:
+            raise KeyError(curie)
+        return label
+
+    def __iter__(self) -> Iterator[str]:
+        for curie_id in range(len(self._artifact.curies)):
+            if self._artifact.labels[curie_id]:
+                yield self._artifact.curies[curie_id]
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(np.diff(self._artifact.labels._offsets)))
+
+
+class LexiconArtifact:
+    """
+    A memory-mapped lexicon artifact.
+    """
+
+    def __init__(self, path: Path):
+        """
+        :param path: Location of the artifact file.
+        """
+        self.path = Path(path)
+        with open(self.path, "rb") as artifact:
+            if artifact.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a lexicon artifact")
+            header_length = int.from_bytes(artifact.read(8), "little")
+            self.header = json.loads(artifact.read(header_length))
+        data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+
+        buffer = np.memmap(self.path, dtype=np.uint8, mode="r")
+        arrays = {}
+        for name, spec in self.header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            start = data_start + spec["offset"]
+            arrays[name] = buffer[start:start + spec["length"] * dtype.itemsize].view(dtype)
+
+        self.curies = _StringTable(arrays["curie_data"], arrays["curie_offsets"])
+        self.labels = _StringTable(arrays["label_data"], arrays["label_offsets"])
+        self.terms = _StringTable(arrays["term_data"], arrays["term_offsets"])
+        self.entry_offsets = arrays["entry_offsets"]
+        self.entry_curies = arrays["entry_curies"]
+        self.entry_predicates = arrays["entry_predicates"]
+
+    @property
+    def ontology_id(self) -> str:
+        return self.header["ontology_id"]
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.header["version"]
+
+    def is_stale(self, db_path: Optional[str] = None) -> bool:
+        """
+        :param db_path: Path to the semsql database, the one the artifact was built from if None.
+        :returns: Whether the semsql database changed since the artifact was built.
+        """
+        source = self.header["source"]
+        db_path = db_path or source["path"]
+        if not os.path.exists(db_path):
+            return False
+        stamp = _source_stamp(db_path)
+        return stamp["size"] != source["size"] or stamp["mtime"] != source["mtime"]
+
+    def synonym_predicates(self, term: str) -> List[Tuple[str, str]]:
+        """
+        :param term: A normalized term.
+        :returns: List of (curie, predicate) of the labels and synonyms equal to the term.
+        """
+        term_id = self.terms.find(term)
+        if term_id < 0:
+            return []
+        entries = slice(self.entry_offsets[term_id], self.entry_offsets[term_id + 1])
+        return [(self.curies[curie_id], self.header["predicates"][code])
+                for curie_id, code in zip(self.entry_curies[entries], self.entry_predicates[entries])]
+
+    def to_lexicon(self) -> Lexicon:
+        """
+        :returns: A Lexicon whose indexes are read-only views of the mapped artifact.
+        """
+        return Lexicon.from_indexes(self.ontology_id, _LabelIndex(self), _TermIndex(self, synonyms=False),
+                                    _TermIndex(self, synonyms=True))
+
+
+def open_lexicon_artifact(lexicon_dir: Path, ontology_id: str,
+                          db_path: Optional[str] = None) -> Optional[LexiconArtifact]:
+    """
+    Open the lexicon artifact of an ontology, if one was built and is up to date.
+    :param lexicon_dir: Directory of the lexicon artifacts.
+    :param ontology_id: The OBO identifier of the ontology.
+    :param db_path: Path to the semsql database, to check that the artifact is not stale.
+    :returns: The mapped artifact, or None if there is no usable artifact.
+    """
+    path = artifact_path(lexicon_dir, ontology_id)
+    if not path.exists():
+        return None
+    artifact = LexiconArtifact(path)
+    if artifact.is_stale(db_path):
+        logger.warning(f"Lexicon artifact {path} is older than the ontology database, run build-lexicon to update it")
+        return None
+    logger.info(f"Using lexicon artifact {path} ({artifact.version})")
+    return artifact
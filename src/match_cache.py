@@ -0,0 +1,165 @@
+"""
+Persistent on-disk cache of ontology search results, shared across runs.
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+__all__ = [
+    "DEFAULT_CACHE_PATH",
+    "DEFAULT_MAX_ENTRIES",
+    "MatchCache",
+]
+
+logger = logging.getLogger("harmonize.match_cache")
+
+DEFAULT_CACHE_PATH = Path.home() / ".data" / "harmonica" / "match_cache.db"
+DEFAULT_MAX_ENTRIES = 5_000_000
+
+# Hits are stored as a JSON list of [curie, label] pairs; an empty list records a term with no match
+Hits = List[Tuple[str, str]]
+
+
+class MatchCache:
+    """
+    SQLite-backed cache of search results keyed by
+    (ontology id, ontology versionIRI, match tier, normalized term).
+    Entries of an older ontology version are never returned, so a new release is searched from scratch.
+    The least recently used entries are evicted once the cache grows past `max_entries`.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        :param path: Location of the cache database file.
+        :param max_entries: Maximum number of cached terms kept across all ontologies.
+        """
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS match (
+                ontology_id TEXT NOT NULL,
+                version TEXT NOT NULL,
+                tier TEXT NOT NULL,
+                term TEXT NOT NULL,
+                hits TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (ontology_id, version, tier, term)
+            ) WITHOUT ROWID
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS match_last_used ON match (last_used)")
+        self.connection.commit()
+
+    def get_many(self, ontology_id: str, version: str, tier: str, terms: Iterable[str]) -> Dict[str, Hits]:
+        """
+        Look up cached results for a batch of normalized terms.
+        :param ontology_id: The OBO identifier of the ontology.
+        :param version: The owl:versionIRI of the ontology.
+        :param tier: The match tier, e.g. 'EXACT_LABEL' or 'EXACT_ALIAS'.
+        :param terms: Normalized terms to look up.
+        :returns: Dict of term to list of (curie, label) for the terms found in the cache.
+        """
+        terms = list(terms)
+        found = {}
+        # Stay well below SQLITE_MAX_VARIABLE_NUMBER
+        for start in range(0, len(terms), 500):
+            batch = terms[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT term, hits FROM match WHERE ontology_id = ? AND version = ? AND tier = ? "
+                f"AND term IN ({','.join('?' * len(batch))})",
+                [ontology_id, version, tier, *batch],
+            )
+            for term, hits in rows:
+                found[term] = [tuple(hit) for hit in json.loads(hits)]
+
+        if found:
+            now = time.time()
+            self.connection.executemany(
+                "UPDATE match SET last_used = ? WHERE ontology_id = ? AND version = ? AND tier = ? AND term = ?",
+                [(now, ontology_id, version, tier, term) for term in found],
+            )
+            self.connection.commit()
+
+        self.hits += len(found)
+        self.misses += len(terms) - len(found)
+        logger.info(f"Match cache {ontology_id} {tier}: {len(found)} hits, {len(terms) - len(found)} misses")
+        return found
+
+    def put_many(self, ontology_id: str, version: str, tier: str, results: Dict[str, Hits]) -> None:
+        """
+        Store search results for a batch of normalized terms and evict old entries if over the size limit.
+        :param ontology_id: The OBO identifier of the ontology.
+        :param version: The owl:versionIRI of the ontology.
+        :param tier: The match tier, e.g. 'EXACT_LABEL' or 'EXACT_ALIAS'.
+        :param results: Dict of term to list of (curie, label), empty for terms without a match.
+        """
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO match (ontology_id, version, tier, term, hits, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+            [(ontology_id, version, tier, term, json.dumps(hits), now) for term, hits in results.items()],
+        )
+        self.connection.commit()
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used entries beyond `max_entries`.
+        :returns: The number of evicted entries.
+        """
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM match").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+        self.connection.execute(
+            "DELETE FROM match WHERE (ontology_id, version, tier, term) IN "
+            "(SELECT ontology_id, version, tier, term FROM match ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self.connection.commit()
+        logger.info(f"Evicted {excess} entries from match cache")
+        return excess
+
+    def stats(self) -> List[Dict]:
+        """
+        :returns: Number of entries per ontology, version and match tier.
+        """
+        rows = self.connection.execute(
+            "SELECT ontology_id, version, tier, COUNT(*), SUM(hits != '[]'), MAX(last_used) "
+            "FROM match GROUP BY ontology_id, version, tier ORDER BY ontology_id, version, tier"
+        )
+        return [
+            {
+                "ontology_id": ontology_id,
+                "version": version,
+                "tier": tier,
+                "entries": entries,
+                "matched_entries": matched,
+                "last_used": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(last_used)),
+            }
+            for ontology_id, version, tier, entries, matched, last_used in rows
+        ]
+
+    def clear(self, ontology_id: str = None) -> int:
+        """
+        Delete cached entries.
+        :param ontology_id: Only delete entries of this ontology, all entries if None.
+        :returns: The number of deleted entries.
+        """
+        if ontology_id:
+            cursor = self.connection.execute("DELETE FROM match WHERE ontology_id = ?", (ontology_id,))
+        else:
+            cursor = self.connection.execute("DELETE FROM match")
+        self.connection.commit()
+        self.connection.execute("VACUUM")
+        return cursor.rowcount
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,187 @@
+"""
+Ontology QC checks run together in a single streaming pass over an OWL file.
+
+Each check collects what it needs from the entities and axioms into hash maps while the file is read,
+and reports its violations at the end, instead of joining triples against themselves in SPARQL.
+New checks subclass QcCheck and are added to QC_CHECKS with @register_check.
+"""
+
+import logging
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+import pandas as pd
+
+from owl_stream import DEFAULT_OWL_CACHE_DIR, HAS_DBXREF, OBO, OBO_IN_OWL, RDFS_LABEL, OwlAxiom, OwlEntity, read_owl
+
+__all__ = [
+    "QC_CHECKS",
+    "QcCheck",
+    "register_check",
+    "run_qc_checks",
+]
+
+logger = logging.getLogger("harmonize.owl_qc")
+
+HAS_SYNONYM_TYPE = OBO_IN_OWL + "hasSynonymType"
+ABBREVIATION = OBO + "mondo#ABBREVIATION"
+MONDO_PREFIX = OBO + "MONDO_"
+
+# Prefixes used to shorten IRIs in the report
+CURIE_PREFIXES = {
+    "http://www.w3.org/2000/01/rdf-schema#": "rdfs:",
+    OBO_IN_OWL: "oboInOwl:",
+}
+
+# A row of the report: (entity, property, value)
+Violation = Tuple[str, str, str]
+
+
+def _curie(iri: str) -> str:
+    """
+    :returns: The CURIE of an OBO or well-known IRI, e.g. MONDO:0000001, or the IRI itself.
+    """
+    for namespace, prefix in CURIE_PREFIXES.items():
+        if iri.startswith(namespace):
+            return prefix + iri[len(namespace):]
+    if iri.startswith(OBO) and "_" in iri[len(OBO):] and "#" not in iri:
+        return iri[len(OBO):].replace("_", ":", 1)
+    return iri
+
+
+class QcCheck:
+    """
+    Base class of the QC checks. Subclasses set `name` and `description`, collect data in `add_entity`
+    and `add_axiom`, and yield (entity, property, value) violations from `violations`.
+    """
+    name: str = ""
+    description: str = ""
+
+    def add_entity(self, entity: OwlEntity) -> None:
+        pass
+
+    def add_axiom(self, axiom: OwlAxiom) -> None:
+        pass
+
+    def violations(self) -> Iterator[Violation]:
+        raise NotImplementedError
+
+
+# Registered checks by name, in the order they are reported
+QC_CHECKS: Dict[str, Type[QcCheck]] = {}
+
+
+def register_check(check: Type[QcCheck]) -> Type[QcCheck]:
+    """
+    Class decorator adding a check to QC_CHECKS.
+    """
+    QC_CHECKS[check.name] = check
+    return check
+
+
+@register_check
+class DuplicateLabelSynonymCheck(QcCheck):
+    name = "duplicate_label_synonym"
+    description = "No two non-deprecated entities should share a label or exact synonym, abbreviations aside"
+    # Values are compared as plain strings, so "x"@en and "x" count as the same value
+
+    PROPERTIES = (RDFS_LABEL, OBO_IN_OWL + "hasExactSynonym", OBO + "IAO_0000118")
+
+    def __init__(self):
+        # Value to the (entity, property) pairs carrying it
+        self.value_entities: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        self.deprecated = set()
+        self.abbreviations = set()
+
+    def add_entity(self, entity: OwlEntity) -> None:
+        if entity.deprecated:
+            self.deprecated.add(entity.iri)
+        for label in entity.labels:
+            self.value_entities[label].append((entity.iri, RDFS_LABEL))
+        for predicate, synonym in entity.synonyms:
+            if predicate in self.PROPERTIES:
+                self.value_entities[synonym].append((entity.iri, predicate))
+
+    def add_axiom(self, axiom: OwlAxiom) -> None:
+        if ABBREVIATION in axiom.annotations.get(HAS_SYNONYM_TYPE, ()):
+            self.abbreviations.add((axiom.source, axiom.property, axiom.target))
+
+    def violations(self) -> Iterator[Violation]:
+        rows = set()
+        for value, entity_properties in self.value_entities.items():
+            if len(entity_properties) < 2:
+                continue
+            kept = [
+                (entity, predicate) for entity, predicate in set(entity_properties)
+                if entity not in self.deprecated and (entity, predicate, value) not in self.abbreviations
+            ]
+            for entity1, property1 in kept:
+                for entity2, property2 in kept:
+                    if entity1 != entity2:
+                        rows.add((f"{_curie(entity1)}-{_curie(entity2)}", f"{_curie(property1)}-{_curie(property2)}", value))
+        # Same order as the SPARQL query, by upper case value descending
+        yield from sorted(rows, key=lambda row: (row[2].upper(), row[0], row[1]), reverse=True)
+
+
+@register_check
+class SharedEquivalenceXrefCheck(QcCheck):
+    name = "shared_equivalence_xref"
+    description = "No two Mondo IDs should ever point to the same external ID"
+
+    EQUIVALENCE_SOURCES = {
+        "MONDO:equivalentTo",
+        "MONDO:obsoleteEquivalent",
+        "MONDO:equivalentObsolete",
+        "MONDO:obsoleteEquivalentObsolete",
+    }
+
+    def __init__(self):
+        self.entity_xrefs = set()
+        # Xref to the Mondo entities whose xref axiom has an equivalence source
+        self.equivalence_xrefs: Dict[str, set] = defaultdict(set)
+
+    def add_entity(self, entity: OwlEntity) -> None:
+        if entity.iri.startswith(MONDO_PREFIX):
+            self.entity_xrefs.update((entity.iri, xref) for xref in entity.xrefs)
+
+    def add_axiom(self, axiom: OwlAxiom) -> None:
+        if (axiom.property == HAS_DBXREF and axiom.source.startswith(MONDO_PREFIX)
+                and self.EQUIVALENCE_SOURCES.intersection(axiom.annotations.get(OBO_IN_OWL + "source", ()))):
+            self.equivalence_xrefs[axiom.target].add(axiom.source)
+
+    def violations(self) -> Iterator[Violation]:
+        rows = set()
+        for xref, entities in self.equivalence_xrefs.items():
+            entities = [entity for entity in entities if (entity, xref) in self.entity_xrefs]
+            for entity1 in entities:
+                for entity2 in entities:
+                    if entity1 != entity2:
+                        rows.add((entity1, xref, entity2))
+        yield from sorted(rows)
+
+
+def run_qc_checks(ontology_file_path: str, checks: Optional[Iterable[str]] = None,
+                  cache_dir: Optional[Path] = DEFAULT_OWL_CACHE_DIR) -> pd.DataFrame:
+    """
+    Run QC checks in one pass over an OWL file.
+    :param ontology_file_path: Path to the OWL file in RDF/XML.
+    :param checks: Names of the checks to run, all registered checks if None.
+    :param cache_dir: Directory of the OWL record cache, or None to always parse the file.
+    :returns: Report with one row per violation and columns check, entity, property, value.
+    """
+    checks = [QC_CHECKS[name]() for name in (checks or QC_CHECKS)]
+    for record in read_owl(ontology_file_path, cache_dir):
+        if isinstance(record, OwlAxiom):
+            for check in checks:
+                check.add_axiom(record)
+        else:
+            for check in checks:
+                check.add_entity(record)
+
+    rows = []
+    for check in checks:
+        violations = list(check.violations())
+        logger.info(f"QC {check.name}: {len(violations)} violations")
+        rows.extend((check.name, entity, property_, value) for entity, property_, value in violations)
+    return pd.DataFrame(rows, columns=["check", "entity", "property", "value"])
@@ -0,0 +1,265 @@
+"""
+Streaming reader of OWL files in RDF/XML, extracting classes, labels, synonyms, xrefs and deprecation
+in one pass with constant memory instead of loading the whole graph with rdflib.
+The extracted records are cached on disk, keyed by the content hash of the OWL file.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+__all__ = [
+    "DEFAULT_OWL_CACHE_DIR",
+    "OwlAxiom",
+    "OwlEntity",
+    "count_owl_classes",
+    "get_owl_classes",
+    "iter_owl",
+    "read_owl",
+]
+
+logger = logging.getLogger("harmonize.owl_stream")
+
+RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+RDFS = "http://www.w3.org/2000/01/rdf-schema#"
+OWL = "http://www.w3.org/2002/07/owl#"
+OBO_IN_OWL = "http://www.geneontology.org/formats/oboInOwl#"
+OBO = "http://purl.obolibrary.org/obo/"
+
+RDFS_LABEL = RDFS + "label"
+OWL_CLASS = OWL + "Class"
+OWL_AXIOM = OWL + "Axiom"
+OWL_DEPRECATED = OWL + "deprecated"
+HAS_DBXREF = OBO_IN_OWL + "hasDbXref"
+SYNONYM_PROPERTIES = (
+    OBO_IN_OWL + "hasExactSynonym",
+    OBO_IN_OWL + "hasRelatedSynonym",
+    OBO_IN_OWL + "hasNarrowSynonym",
+    OBO_IN_OWL + "hasBroadSynonym",
+    OBO + "IAO_0000118",
+)
+
+DEFAULT_OWL_CACHE_DIR = Path.home() / ".data" / "harmonica" / "owl_cache"
+# Number of records per pickled batch of the cache file
+CACHE_BATCH_SIZE = 10_000
+
+_RDF_ABOUT = f"{{{RDF}}}about"
+_RDF_RESOURCE = f"{{{RDF}}}resource"
+_RDF_NODE_ID = f"{{{RDF}}}nodeID"
+
+
+class OwlEntity(NamedTuple):
+    """
+    A named resource described in the OWL file, with its annotations.
+    """
+    iri: str
+    types: List[str]
+    labels: List[str]
+    # (synonym property IRI, synonym)
+    synonyms: List[Tuple[str, str]]
+    xrefs: List[str]
+    deprecated: bool
+
+
+ENTITY_FIELDS = len(OwlEntity._fields)
+
+
+class OwlAxiom(NamedTuple):
+    """
+    An annotated axiom, e.g. the synonym type or source of a synonym or xref.
+    """
+    source: str
+    property: str
+    target: str
+    # Annotation property IRI to values
+    annotations: Dict[str, List[str]]
+
+
+def _iri(tag: str) -> str:
+    """
+    :returns: The IRI of an ElementTree tag, '{namespace}name' -> 'namespacename'.
+    """
+    return tag[1:].replace("}", "", 1) if tag.startswith("{") else tag
+
+
+def _value(element: ET.Element) -> str:
+    """
+    :returns: The IRI of a resource property, or the text of a literal property.
+    """
+    return element.get(_RDF_RESOURCE) or element.get(_RDF_NODE_ID) or (element.text or "")
+
+
+def _entity(element: ET.Element) -> Optional[OwlEntity]:
+    iri = element.get(_RDF_ABOUT)
+    if iri is None:
+        return None
+    types = [] if element.tag == f"{{{RDF}}}Description" else [_iri(element.tag)]
+    labels, synonyms, xrefs, deprecated = [], [], [], False
+    for child in element:
+        predicate = _iri(child.tag)
+        if predicate == RDF + "type":
+            types.append(_value(child))
+        elif predicate == RDFS_LABEL:
+            labels.append(_value(child))
+        elif predicate in SYNONYM_PROPERTIES:
+            synonyms.append((predicate, _value(child)))
+        elif predicate == HAS_DBXREF:
+            xrefs.append(_value(child))
+        elif predicate == OWL_DEPRECATED:
+            deprecated = _value(child).strip().lower() == "true"
+    return OwlEntity(iri, types, labels, synonyms, xrefs, deprecated)
+
+
+def _axiom(element: ET.Element) -> Optional[OwlAxiom]:
+    source, property_, target, annotations = None, None, None, {}
+    for child in element:
+        predicate = _iri(child.tag)
+        if predicate == OWL + "annotatedSource":
+            source = _value(child)
+        elif predicate == OWL + "annotatedProperty":
+            property_ = _value(child)
+        elif predicate == OWL + "annotatedTarget":
+            target = _value(child)
+        elif predicate != RDF + "type":
+            annotations.setdefault(predicate, []).append(_value(child))
+    if source is None or property_ is None or target is None:
+        return None
+    return OwlAxiom(source, property_, target, annotations)
+
+
+def iter_owl(ontology_file_path: str) -> Iterator[Union[OwlEntity, OwlAxiom]]:
+    """
+    Read an RDF/XML OWL file one top-level element at a time.
+    Each element is discarded once read, so memory use does not grow with the size of the file.
+    :param ontology_file_path: Path to the OWL file in RDF/XML.
+    :returns: Iterator of the named entities and annotated axioms, in file order.
+    """
+    depth = 0
+    root = None
+    for event, element in ET.iterparse(ontology_file_path, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        # Only the children of rdf:RDF are complete descriptions
+        if depth != 1:
+            continue
+        if _iri(element.tag) == OWL_AXIOM:
+            record = _axiom(element)
+        else:
+            record = _entity(element)
+        # Drop the element and everything read so far from the tree
+        root.clear()
+        if record is not None:
+            yield record
+
+
+def _file_digest(file_path: Path) -> str:
+    """
+    :returns: The SHA-256 hash of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_owl(ontology_file_path: str,
+             cache_dir: Optional[Path] = DEFAULT_OWL_CACHE_DIR) -> Iterator[Union[OwlEntity, OwlAxiom]]:
+    """
+    Read the records of an OWL file like iter_owl, from the cache if the file was read before.
+    The first read parses the file and writes the records to the cache as batches of pickled tuples,
+    which load much faster than parsing XML and are read back one batch at a time.
+    The cache file name holds the content hash, so a changed OWL file is parsed again and replaces its old entry.
+    :param ontology_file_path: Path to the OWL file in RDF/XML.
+    :param cache_dir: Directory of the cache, or None to always parse the file.
+    :returns: Iterator of the named entities and annotated axioms, in file order.
+    """
+    if cache_dir is None:
+        yield from iter_owl(ontology_file_path)
+        return
+
+    file_path = Path(ontology_file_path)
+    path_key = hashlib.sha1(str(file_path.resolve()).encode("utf-8")).hexdigest()[:12]
+    cache_path = Path(cache_dir) / f"{file_path.stem}-{path_key}-{_file_digest(file_path)}.records"
+    if cache_path.exists():
+        logger.info(f"Reading {file_path} from cache {cache_path}")
+        with open(cache_path, "rb") as cache_file:
+            while True:
+                try:
+                    batch = pickle.load(cache_file)
+                except EOFError:
+                    break
+                for fields in batch:
+                    yield OwlEntity._make(fields) if len(fields) == ENTITY_FIELDS else OwlAxiom._make(fields)
+        return
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, so an interrupted read never leaves a partial cache entry
+    temporary_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    complete = False
+    try:
+        with open(temporary_path, "wb") as cache_file:
+            batch = []
+            for record in iter_owl(file_path):
+                # Plain tuples load much faster than named tuples
+                batch.append(tuple(record))
+                if len(batch) == CACHE_BATCH_SIZE:
+                    pickle.dump(batch, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+                    batch = []
+                yield record
+            if batch:
+                pickle.dump(batch, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        complete = True
+    finally:
+        if complete:
+            # Drop the entries of earlier versions of the same file
+            for stale_path in cache_path.parent.glob(f"{file_path.stem}-{path_key}-*.records"):
+                stale_path.unlink()
+            os.replace(temporary_path, cache_path)
+            logger.info(f"Cached the records of {file_path} at {cache_path}")
+        else:
+            temporary_path.unlink(missing_ok=True)
+
+
+def get_owl_classes(ontology_file_path: str, iri_prefix: str = OBO + "MONDO_",
+                    cache_dir: Optional[Path] = DEFAULT_OWL_CACHE_DIR) -> List[Tuple[str, str]]:
+    """
+    Get the non-obsolete classes and their labels, the same (class, label) pairs as the rdflib SPARQL query
+    of classes with an IRI starting with `iri_prefix` and a label not starting with 'obsolete'.
+    :param ontology_file_path: Path to the OWL file in RDF/XML.
+    :param iri_prefix: Namespace of the classes to keep.
+    :param cache_dir: Directory of the record cache, or None to always parse the file.
+    :returns: Distinct (class IRI, label) pairs.
+    """
+    # The type and labels of a resource may be given in separate top-level elements, e.g. an owl:Class and an
+    # rdf:Description with the same rdf:about, so they are collected per IRI before filtering
+    classes = set()
+    labels = {}
+    for record in read_owl(ontology_file_path, cache_dir):
+        if not isinstance(record, OwlEntity) or not record.iri.startswith(iri_prefix):
+            continue
+        if OWL_CLASS in record.types:
+            classes.add(record.iri)
+        for label in record.labels:
+            if not label.startswith("obsolete"):
+                labels[(record.iri, label)] = None
+    return [(iri, label) for iri, label in labels if iri in classes]
+
+
+def count_owl_classes(ontology_file_path: str, iri_prefix: str = OBO + "MONDO_",
+                      cache_dir: Optional[Path] = DEFAULT_OWL_CACHE_DIR) -> int:
+    """
+    :param ontology_file_path: Path to the OWL file in RDF/XML.
+    :param iri_prefix: Namespace of the classes to count.
+    :param cache_dir: Directory of the record cache, or None to always parse the file.
+    :returns: The number of distinct classes returned by get_owl_classes.
+    """
+    return len({owl_class for owl_class, _ in get_owl_classes(ontology_file_path, iri_prefix, cache_dir)})
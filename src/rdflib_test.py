@@ -1,65 +1,14 @@
-from rdflib import Graph, RDF, RDFS, OWL
-from rdflib.plugins.sparql import prepareQuery
+from owl_stream import count_owl_classes, get_owl_classes as read_owl_classes
 
 
 def get_owl_classes(ontology_file_path):
-    # Create a RDFLib graph
-    g = Graph()
-
-    # Load the ontology into the graph
-    g.parse(ontology_file_path)
-
-    # Query for all classes using SPARQL
-    query = """
-    SELECT DISTINCT ?class ?label
-    WHERE {
-        ?class a owl:Class .
-        OPTIONAL { ?class rdfs:label ?label }
-        FILTER (
-            STRSTARTS(STR(?class), "http://purl.obolibrary.org/obo/MONDO_") &&
-            !STRSTARTS(?label, "obsolete")
-        )
-    }
-    """
-    
-    # Execute the query on the graph
-    results = g.query(query, initNs={"owl": OWL, "rdfs": RDFS})
-
-    # Extract the classes and labels from the query results
-    # mondo_classes_with_labels = [(result['class'], result['label']) for result in results]
-    mondo_classes_with_labels = [(str(result['class']), str(result['label'])) for result in results]
-
-    return mondo_classes_with_labels
+    # Stream the ontology file instead of loading the whole graph into memory
+    return read_owl_classes(ontology_file_path)
 
 
 def count_mondo_classes(ontology_file_path):
-    # Create a RDFLib graph
-    g = Graph()
-
-    # Load the ontology into the graph
-    g.parse(ontology_file_path)
-
-    # Define a SPARQL query template with COUNT
-    query_template = """
-    SELECT (COUNT(DISTINCT ?class) as ?count)
-    WHERE {
-        ?class a owl:Class .
-        OPTIONAL { ?class rdfs:label ?label }
-        FILTER (
-            STRSTARTS(STR(?class), "http://purl.obolibrary.org/obo/MONDO_") &&
-            !STRSTARTS(?label, "obsolete")
-        )
-    }
-    """
-
-    # results = g.query(query, initNs={"owl": OWL, "rdfs": RDFS})
-    # Prepare the SPARQL query
-    query = prepareQuery(query_template, initNs={"owl": OWL, "rdfs": RDFS})
-
-    # Execute the query on the graph and retrieve the count
-    result = g.query(query).bindings[0]['count'].value
-
-    return int(result)
+    # Count of distinct classes, see get_owl_classes for the classes included
+    return count_owl_classes(ontology_file_path)
 
 
 # Example usage
@@ -73,8 +22,8 @@ for owl_class, label in classes:
 
 
 
-# Get only count of classes. See sparql query for where clause details
-count_of_mondo_classes = count_mondo_classes(ontology_file_path)
+# Get only count of classes, from the classes already read instead of parsing the file again
+count_of_mondo_classes = len({owl_class for owl_class, _ in classes})
 # Print the count of classes
 print(f"Count of MONDO classes: {count_of_mondo_classes}")
 
@@ -0,0 +1,138 @@
+"""
+Timers and counters of the stages of a harmonization run, written as JSON to diagnose slow runs.
+
+Stages and counters are named with dots, ontology first where they belong to one ontology,
+e.g. 'mondo.fetch', 'mondo.EXACT_LABEL' or 'mondo.EXACT_LABEL.rows_matched'.
+"""
+
+import cProfile
+import json
+import logging
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+__all__ = [
+    "RunMetrics",
+    "profiling",
+]
+
+logger = logging.getLogger("harmonize.run_metrics")
+
+# Number of allocation sites reported by the memory trace
+TOP_ALLOCATIONS = 20
+
+
+class RunMetrics:
+    """
+    Accumulated wall time and calls per stage, and named counters.
+    Plain dicts only, so metrics collected in a worker process can be returned and merged.
+    """
+
+    def __init__(self, log: bool = False):
+        """
+        :param log: Whether to log a line each time a stage ends.
+        """
+        self.log = log
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self._start = time.perf_counter()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = defaultdict(int)
+        # owl:versionIRI of each opened ontology
+        self.versions: Dict[str, Optional[str]] = {}
+        self.extra: Dict[str, object] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time a stage. A stage entered several times, e.g. once per chunk, accumulates its time and calls.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            stage["seconds"] += seconds
+            stage["calls"] += 1
+            if self.log:
+                logger.info(f"Stage {name}: {seconds:.3f} s")
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] += int(value)
+
+    def merge(self, other: "RunMetrics"):
+        """
+        Add the stages and counters of metrics collected elsewhere, e.g. in a worker process.
+        """
+        for name, other_stage in other.stages.items():
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            stage["seconds"] += other_stage["seconds"]
+            stage["calls"] += other_stage["calls"]
+        for name, value in other.counters.items():
+            self.counters[name] += value
+        self.versions.update(other.versions)
+        self.extra.update(other.extra)
+
+    def to_dict(self) -> dict:
+        return {
+            "started": self.started,
+            "seconds": round(time.perf_counter() - self._start, 4),
+            "stages": {name: {"seconds": round(stage["seconds"], 4), "calls": stage["calls"]}
+                       for name, stage in self.stages.items()},
+            "counters": dict(sorted(self.counters.items())),
+            "versions": self.versions,
+            **self.extra,
+        }
+
+    def write(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2) + "\n")
+        logger.info(f"Run metrics written to {path}")
+
+    def log_summary(self):
+        """
+        Log one line per stage, slowest first, and one per counter.
+        """
+        for name, stage in sorted(self.stages.items(), key=lambda item: -item[1]["seconds"]):
+            logger.info(f"{name}: {stage['seconds']:.3f} s in {stage['calls']} calls")
+        for name, value in sorted(self.counters.items()):
+            logger.info(f"{name}: {value}")
+
+
+@contextmanager
+def profiling(metrics: RunMetrics, profile_path: Optional[Path] = None, trace_memory: bool = False) -> Iterator[None]:
+    """
+    Optionally profile the enclosed code with cProfile and trace its memory allocations with tracemalloc.
+    Only the current process is profiled, not worker processes.
+    :param metrics: Metrics of the run, the peak traced memory and top allocation sites are added to them.
+    :param profile_path: File to dump the cProfile statistics to, for pstats or snakeviz, or None to not profile.
+    :param trace_memory: Whether to trace memory allocations.
+    """
+    profiler = cProfile.Profile() if profile_path is not None else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            Path(profile_path).parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(profile_path))
+            logger.info(f"Profile written to {profile_path}")
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            top_allocations = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+            tracemalloc.stop()
+            metrics.extra["memory"] = {
+                "peak_traced_mb": round(peak / 1e6, 1),
+                "top_allocations": [{"site": str(statistic.traceback[0]), "mb": round(statistic.size / 1e6, 2),
+                                     "count": statistic.count} for statistic in top_allocations],
+            }
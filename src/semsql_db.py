@@ -0,0 +1,219 @@
+"""
+Preparation and tuned read-only access of semsql SQLite databases for searching.
+
+OAK searches labels and synonyms with `value LIKE ?` over the `statements` table. SQLite only turns a
+case-insensitive LIKE into an index range search with an index on the value under the NOCASE collation,
+so prepare_db adds one on (predicate, value COLLATE NOCASE), plus one on (subject, predicate) for label lookups.
+The indexes are added to the cached database in place, or to a sidecar copy that search uses when present.
+"""
+
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+__all__ = [
+    "DEFAULT_PREPARED_DIR",
+    "SEARCH_INDEXES",
+    "adapter_db_path",
+    "create_readonly_engine",
+    "find_prepared_db",
+    "prepare_db",
+    "prepared_db_path",
+]
+
+logger = logging.getLogger("harmonize.semsql_db")
+
+DEFAULT_PREPARED_DIR = Path.home() / ".data" / "harmonica" / "prepared"
+
+# Index name to indexed columns of the statements table
+SEARCH_INDEXES = {
+    "harmonica_statements_predicate_value_nocase": "predicate, value COLLATE NOCASE",
+    "harmonica_statements_subject_predicate": "subject, predicate",
+}
+
+# Connection settings of read-only databases: map up to 1 GiB of the file and cache 256 MiB of pages
+MMAP_SIZE = 1 << 30
+CACHE_SIZE_KIB = 256 * 1024
+
+# Table of the prepared sidecar copy recording the database it was copied from
+_SOURCE_TABLE = "harmonica_prepared_source"
+
+
+def adapter_db_path(adapter) -> str:
+    """
+    :param adapter: An OAK SqlImplementation.
+    :returns: The file path of its SQLite database, also for read-only connections opened with a file: URI.
+    """
+    database = adapter.engine.url.database
+    return database[len("file:"):] if database.startswith("file:") else database
+
+
+def create_readonly_engine(db_path: str):
+    """
+    Create an SQLAlchemy engine reading a semsql database read-only and in immutable mode, so that many connections
+    can read it concurrently without any locking, with memory-mapped I/O and a large page cache.
+    :param db_path: Path to the semsql SQLite database file.
+    """
+    from sqlalchemy import create_engine, event
+
+    engine = create_engine(f"sqlite:///file:{db_path}?mode=ro&immutable=1&uri=true")
+
+    @event.listens_for(engine, "connect")
+    def tune_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        cursor.close()
+
+    return engine
+
+
+def prepared_db_path(prepared_dir: Path, ontology_id: str) -> Path:
+    """
+    :returns: The location of the prepared sidecar copy of the database of an ontology.
+    """
+    return Path(prepared_dir) / f"{ontology_id.lower()}.db"
+
+
+def _source_stamp(db_path: str) -> Dict[str, str]:
+    stat = os.stat(db_path)
+    return {"path": str(db_path), "size": str(stat.st_size), "mtime": str(stat.st_mtime)}
+
+
+def find_prepared_db(prepared_dir: Optional[Path], ontology_id: str, db_path: str) -> Optional[str]:
+    """
+    Find the prepared sidecar copy of a database, if prepare-db made one and the database did not change since.
+    :param prepared_dir: Directory of the prepared copies, or None to not use them.
+    :param ontology_id: The OBO identifier of the ontology.
+    :param db_path: Path to the cached semsql database.
+    :returns: The path of the prepared copy, or None if there is no usable copy.
+    """
+    if prepared_dir is None:
+        return None
+    path = prepared_db_path(prepared_dir, ontology_id)
+    if not path.exists():
+        return None
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        source = dict(connection.execute(f"SELECT key, value FROM {_SOURCE_TABLE}"))
+    except sqlite3.OperationalError:
+        source = {}
+    finally:
+        connection.close()
+    if source != _source_stamp(db_path):
+        logger.warning(f"Prepared database {path} is older than {db_path}, run prepare-db to update it")
+        return None
+    return str(path)
+
+
+def _add_indexes(db_path: str) -> List[str]:
+    """
+    :returns: The names of the indexes created, those already present are skipped.
+    """
+    connection = sqlite3.connect(db_path)
+    try:
+        existing = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        created = []
+        for name, columns in SEARCH_INDEXES.items():
+            if name not in existing:
+                logger.info(f"Creating index {name} on statements ({columns})")
+                connection.execute(f"CREATE INDEX {name} ON statements ({columns})")
+                created.append(name)
+        connection.commit()
+        return created
+    finally:
+        connection.close()
+
+
+def _sample(db_path: str, sample_size: int) -> Dict[str, list]:
+    """
+    :returns: Labels in lower case and their CURIEs, the same for every call on the same database.
+    """
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = connection.execute(
+            "SELECT subject, value FROM statements WHERE predicate = 'rdfs:label' AND value IS NOT NULL "
+            "AND subject NOT LIKE '\\_:%' ESCAPE '\\' ORDER BY subject LIMIT ?", (sample_size,)).fetchall()
+    finally:
+        connection.close()
+    return {"terms": [value.lower() for _, value in rows], "curies": [subject for subject, _ in rows]}
+
+
+def profile_searches(db_path: str, sample: Dict[str, list]) -> Dict[str, dict]:
+    """
+    Time the queries OAK issues for each search configuration and show their query plans.
+    :param db_path: Path to the semsql database.
+    :param sample: Terms and CURIEs to query, see _sample.
+    :returns: Dict of configuration to the number of queries, their total seconds and the plan of the first query.
+    """
+    from oaklib.datamodels.search import SearchConfiguration, SearchProperty
+    from oaklib.implementations.sqldb.sql_implementation import SqlImplementation
+    from sqlalchemy import event
+
+    engine = create_readonly_engine(db_path)
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    adapter = SqlImplementation(engine=engine)
+    searches = {
+        "EXACT_LABEL": lambda: [list(adapter.basic_search(term, config=SearchConfiguration(
+            properties=[SearchProperty.LABEL], force_case_insensitive=True))) for term in sample["terms"]],
+        "EXACT_ALIAS": lambda: [list(adapter.basic_search(term, config=SearchConfiguration(
+            properties=[SearchProperty.ALIAS], force_case_insensitive=True))) for term in sample["terms"]],
+        "labels": lambda: list(adapter.labels(sample["curies"])),
+    }
+    report = {}
+    for name, search in searches.items():
+        statements.clear()
+        start = time.perf_counter()
+        search()
+        seconds = time.perf_counter() - start
+        plan = []
+        if statements:
+            statement, parameters = statements[-1]
+            with engine.connect() as connection:
+                plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+        report[name] = {"queries": len(statements), "seconds": round(seconds, 4), "plan": plan}
+    engine.dispose()
+    return report
+
+
+def prepare_db(ontology_id: str, db_path: str, prepared_dir: Optional[Path] = DEFAULT_PREPARED_DIR,
+               sample_size: int = 50) -> dict:
+    """
+    Add the search indexes to the database of an ontology and report the query plans and timings before and after.
+    :param ontology_id: The OBO identifier of the ontology.
+    :param db_path: Path to the cached semsql database.
+    :param prepared_dir: Directory of the sidecar copy to prepare, or None to add the indexes to the database in place.
+    :param sample_size: Number of labels searched for the timings.
+    :returns: Report with the prepared database, the indexes created and the profile before and after.
+    """
+    target_path = str(db_path)
+    if prepared_dir is not None:
+        target_path = str(prepared_db_path(prepared_dir, ontology_id))
+        if find_prepared_db(prepared_dir, ontology_id, db_path) is None:
+            Path(target_path).parent.mkdir(parents=True, exist_ok=True)
+            logger.info(f"Copying {db_path} to {target_path}")
+            # Copy to a temporary file first, so search never opens a partial copy
+            temporary_path = f"{target_path}.{os.getpid()}.tmp"
+            shutil.copyfile(db_path, temporary_path)
+            connection = sqlite3.connect(temporary_path)
+            connection.execute(f"CREATE TABLE {_SOURCE_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+            connection.executemany(f"INSERT INTO {_SOURCE_TABLE} VALUES (?, ?)", _source_stamp(db_path).items())
+            connection.commit()
+            connection.close()
+            os.replace(temporary_path, target_path)
+
+    sample = _sample(target_path, sample_size)
+    before = profile_searches(target_path, sample)
+    created = _add_indexes(target_path)
+    after = profile_searches(target_path, sample)
+    return {"ontology_id": ontology_id, "database": target_path, "indexes_created": created,
+            "sample_size": len(sample["terms"]), "before": before, "after": after}
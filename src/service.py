@@ -0,0 +1,191 @@
+"""
+Local HTTP/JSON service matching batches of terms against ontologies that stay open between requests.
+
+Endpoints:
+    GET  /health      -> {"status": "ok"}
+    GET  /ontologies  -> {"mondo": {"version": ..., "engine": ..., "tiers": [...]}, ...}
+    POST /match       <- {"terms": ["Heart disease", ...], "oid": ["mondo", "hp"], "tiers": ["EXACT_LABEL"]}
+                      -> {"results": [{"term": "Heart disease", "matches": {"mondo": {"match_type": "MONDO_EXACT_LABEL",
+                          "hits": [{"curie": "MONDO:...", "label": "...", "score": 1.0}]}, "hp": null}}, ...]}
+
+"oid" defaults to all served ontologies and "tiers" to the tiers the service was started with.
+"""
+
+import json
+import logging
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from lexicon import normalize_term
+
+if TYPE_CHECKING:
+    from harmonize import OntologySearcher
+
+__all__ = [
+    "HarmonizationService",
+    "make_server",
+]
+
+logger = logging.getLogger("harmonize.service")
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+class ServiceError(ValueError):
+    """
+    An invalid request, answered with a 400 response.
+    """
+
+
+class HarmonizationService:
+    """
+    Matches terms with opened OntologySearcher instances shared by all requests.
+    Lexicon searches only read in-memory indexes and run concurrently, searches through an OAK adapter
+    are serialized per ontology because its database connection is not thread-safe.
+    """
+
+    def __init__(self, searchers: Dict[str, "OntologySearcher"]):
+        """
+        :param searchers: Opened searchers by ontology ID, without a match cache.
+        """
+        self.searchers = searchers
+        self._locks = {ontology_id: threading.Lock() for ontology_id in searchers}
+
+    def ontologies(self) -> dict:
+        return {
+            ontology_id: {
+                "version": searcher.ontology_version,
+                "engine": searcher.engine,
+                "tiers": list(searcher.tiers),
+            }
+            for ontology_id, searcher in self.searchers.items()
+        }
+
+    def _match_ontology(self, ontology_id: str, terms: List[str], tiers: Optional[List[str]]) -> Dict[str, tuple]:
+        searcher = self.searchers[ontology_id]
+        if searcher.engine == "lexicon":
+            return searcher.match_terms(terms, tiers, progress=False)
+        with self._locks[ontology_id]:
+            return searcher.match_terms(terms, tiers, progress=False)
+
+    def match(self, request: dict) -> dict:
+        """
+        :param request: The decoded body of a /match request.
+        :returns: The matches of every requested term in every requested ontology, in the order of the terms.
+        """
+        terms = _string_list(request, "terms", "strings")
+        if terms is None:
+            raise ServiceError("terms must be a list of strings")
+        ontology_ids = _string_list(request, "oid", "ontology IDs") or list(self.searchers)
+        unknown_ontologies = [ontology_id for ontology_id in ontology_ids if ontology_id not in self.searchers]
+        if unknown_ontologies:
+            raise ServiceError(f"Ontologies not served: {', '.join(unknown_ontologies)}")
+        tiers = _string_list(request, "tiers", "tier names")
+        if tiers is not None:
+            tiers = [tier.strip().upper() for tier in tiers]
+            for ontology_id in ontology_ids:
+                # Only the tiers the service was started with have their indexes built
+                unknown_tiers = [tier for tier in tiers if tier not in self.searchers[ontology_id].tiers]
+                if unknown_tiers:
+                    raise ServiceError(f"Match tiers not served for {ontology_id}: {', '.join(unknown_tiers)}")
+
+        normalized_terms = [normalize_term(term) for term in terms]
+        distinct_terms = list(dict.fromkeys(term for term in normalized_terms if term is not None))
+        ontology_matches = {
+            ontology_id: self._match_ontology(ontology_id, distinct_terms, tiers) for ontology_id in ontology_ids
+        }
+
+        results = []
+        for term, normalized in zip(terms, normalized_terms):
+            matches = {}
+            for ontology_id in ontology_ids:
+                match = ontology_matches[ontology_id].get(normalized)
+                if match is None:
+                    matches[ontology_id] = None
+                    continue
+                tier, hits = match
+                ontology_prefix = 'hpo' if ontology_id.lower() == 'hp' else ontology_id
+                matches[ontology_id] = {
+                    "match_type": f"{ontology_prefix.upper()}_{tier}",
+                    "hits": [{"curie": hit[0], "label": hit[1], "score": hit[2] if len(hit) > 2 else 1.0} for hit in hits],
+                }
+            results.append({"term": term, "matches": matches})
+        return {"results": results}
+
+
+def _string_list(request: dict, key: str, description: str) -> Optional[List[str]]:
+    """
+    :param request: The decoded body of a request.
+    :param key: The key of a list of strings in the request.
+    :param description: What the strings are, for the error message.
+    :returns: The list, or None if the key is missing or null.
+    :raises ServiceError: If the value is not a list of strings, e.g. a single string.
+    """
+    value = request.get(key)
+    if value is not None and (not isinstance(value, list) or not all(isinstance(item, str) for item in value)):
+        raise ServiceError(f"{key} must be a list of {description}")
+    return value
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    # Set by make_server
+    service: HarmonizationService = None
+
+    def _send_json(self, status: HTTPStatus, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(HTTPStatus.OK, {"status": "ok"})
+        elif self.path == "/ontologies":
+            self._send_json(HTTPStatus.OK, self.service.ontologies())
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/match":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self._send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": f"Request body over {MAX_BODY_BYTES} bytes"})
+            return
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ServiceError("The request body must be a JSON object")
+            self._send_json(HTTPStatus.OK, self.service.match(request))
+        except (json.JSONDecodeError, ServiceError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+        except Exception as e:
+            logger.error("Failed to match request: %s", str(e), exc_info=True)
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Listen backlog, the default of 5 resets connections of bursts of concurrent clients
+    request_queue_size = 128
+
+
+def make_server(service: HarmonizationService, host: str = "127.0.0.1", port: int = 8000) -> ThreadingHTTPServer:
+    """
+    Create an HTTP server answering each request in its own thread with the shared service.
+    :param service: The service holding the opened ontologies.
+    :param host: Interface to listen on.
+    :param port: Port to listen on, 0 for any free port.
+    :returns: The server, to be run with serve_forever().
+    """
+    handler = type("RequestHandler", (_RequestHandler,), {"service": service})
+    return _Server((host, port), handler)
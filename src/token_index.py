@@ -0,0 +1,112 @@
+"""
+Token-level inverted index with prefix search, for partial and starts-with matching of terms.
+"""
+
+import logging
+import re
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+__all__ = [
+    "TokenIndex",
+    "tokenize",
+]
+
+logger = logging.getLogger("harmonize.token_index")
+
+# Query tokens shorter than this only match whole tokens, so that e.g. 'a' does not match every token starting with 'a'
+MIN_PREFIX_LENGTH = 3
+
+# Sorts after any character, so that [prefix, prefix + PREFIX_END) covers all strings starting with prefix
+PREFIX_END = "\U0010ffff"
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    :param text: A normalized string.
+    :returns: The words of the string.
+    """
+    return _TOKEN_PATTERN.findall(text)
+
+
+class TokenIndex:
+    """
+    Inverted index from tokens to the strings containing them. The vocabulary is a sorted array, so the tokens
+    starting with a prefix are a contiguous range found by binary search, and their posting lists are a
+    contiguous slice of one array.
+    """
+
+    def __init__(self, strings: Iterable[str]):
+        """
+        :param strings: The distinct normalized strings to index, e.g. all labels and synonyms.
+        """
+        self.strings: List[str] = list(strings)
+        string_tokens = [set(tokenize(string)) for string in self.strings]
+        # Number of word characters of each string, the denominator of the score
+        self._token_chars = np.array([sum(map(len, tokenize(string))) for string in self.strings], dtype=np.int64)
+
+        # Posting lists of all tokens in vocabulary order, as one array with offsets
+        pairs = sorted((token, string_id) for string_id, tokens in enumerate(string_tokens) for token in tokens)
+        tokens = np.array([token for token, _ in pairs], dtype=str)
+        self.vocabulary, first = np.unique(tokens, return_index=True)
+        self._offsets = np.append(first, len(pairs)).astype(np.int64)
+        self._postings = np.array([string_id for _, string_id in pairs], dtype=np.int32)
+        logger.info(f"Token index: {len(self.strings)} strings, {len(self.vocabulary)} tokens")
+
+    def _token_ranges(self, tokens: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the posting slices of many query tokens with one vectorized binary search.
+        Long tokens match as prefixes, short tokens only match whole tokens.
+        :returns: (start, end) offsets into the posting array for each token.
+        """
+        tokens = np.array(tokens, dtype=str)
+        is_prefix = np.char.str_len(tokens) >= MIN_PREFIX_LENGTH
+        ends = np.where(is_prefix, np.char.add(tokens, PREFIX_END), tokens)
+        low = np.searchsorted(self.vocabulary, tokens, side='left')
+        high = np.where(is_prefix, np.searchsorted(self.vocabulary, ends, side='left'),
+                        np.searchsorted(self.vocabulary, tokens, side='right'))
+        return self._offsets[low], self._offsets[high]
+
+    def search(self, queries: Sequence[str], min_score: float = 0.5,
+               top_k: int = 3) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Find the indexed strings containing every token of each query, each query token matching the start of a token.
+        The score is the fraction of the word characters of the string covered by the query.
+        :param queries: Normalized query strings.
+        :param min_score: Minimum score of a match, between 0 and 1.
+        :param top_k: Maximum number of matches per query.
+        :returns: Dict of query to list of (matched string, score), best first. Queries without a match are left out.
+        """
+        query_tokens = [sorted(set(tokenize(query))) for query in queries]
+        distinct_tokens = sorted({token for tokens in query_tokens for token in tokens})
+        if not distinct_tokens or not len(self.vocabulary):
+            return {}
+        starts, ends = self._token_ranges(distinct_tokens)
+        token_slices = {token: (start, end) for token, start, end in zip(distinct_tokens, starts, ends)}
+
+        matches = {}
+        for query, tokens in zip(queries, query_tokens):
+            if not tokens:
+                continue
+            # Intersect the smallest posting sets first
+            slices = sorted((token_slices[token] for token in tokens), key=lambda bounds: bounds[1] - bounds[0])
+            string_ids = np.unique(self._postings[slices[0][0]:slices[0][1]])
+            for start, end in slices[1:]:
+                if not len(string_ids):
+                    break
+                string_ids = np.intersect1d(string_ids, self._postings[start:end], assume_unique=False)
+            if not len(string_ids):
+                continue
+
+            query_chars = sum(map(len, tokens))
+            scores = np.minimum(query_chars / np.maximum(self._token_chars[string_ids], 1), 1.0)
+            keep = scores >= min_score - 1e-9
+            string_ids, scores = string_ids[keep], scores[keep]
+            order = np.lexsort((string_ids, -scores))[:top_k]
+            if len(order):
+                matches[query] = [(self.strings[string_id], round(float(score), 3))
+                                  for string_id, score in zip(string_ids[order], scores[order])]
+        return matches
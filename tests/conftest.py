@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from synthetic import make_data, make_ontology_db  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def ontology_db(tmp_path_factory):
+    """
+    A synthetic semsql database of the 'mondo' ontology, whose results have columns in the output.
+    :returns: (database path, (curie, label or synonym) pairs of the ontology)
+    """
+    db_path = tmp_path_factory.mktemp('ontology') / 'mondo.db'
+    terms = make_ontology_db(db_path, 'mondo', classes=300, seed=0)
+    return db_path, terms
+
+
+@pytest.fixture(scope='session')
+def data_df(ontology_db):
+    """
+    A data sheet of 500 rows drawn from the synthetic ontology, with repeated terms, typos and misses.
+    """
+    _, terms = ontology_db
+    return make_data(terms, rows=500, repetition_rate=0.5, seed=0)
@@ -0,0 +1,68 @@
+import click
+import pandas as pd
+import pytest
+
+from checkpoint import RunCheckpoint
+from harmonize import _stream_search
+from lexicon_artifact import artifact_path, build_lexicon_artifact
+from run_metrics import RunMetrics
+
+VERSION = 'http://purl.obolibrary.org/obo/mondo/releases/2024-01-01/mondo.owl'
+
+
+@pytest.fixture
+def data_path(data_df, tmp_path):
+    path = tmp_path / 'data.csv'
+    data_df.to_csv(path, index=False)
+    return path
+
+
+def test_checkpoints_are_kept_only_when_resuming(data_path, tmp_path):
+    work_dir = tmp_path / 'work'
+    checkpoint = RunCheckpoint(work_dir, data_path, {'oid': ['mondo']})
+    checkpoint.save('mondo', {'results': [1, 2]})
+    assert checkpoint.load('mondo') == {'results': [1, 2]}
+    assert checkpoint.load('hp') is None
+
+    assert RunCheckpoint(work_dir, data_path, {'oid': ['mondo']}, resume=True).load('mondo') == {'results': [1, 2]}
+    assert RunCheckpoint(work_dir, data_path, {'oid': ['mondo']}).load('mondo') is None
+
+
+def test_checkpoints_depend_on_the_data_and_settings(data_path, tmp_path):
+    work_dir = tmp_path / 'work'
+    checkpoint = RunCheckpoint(work_dir, data_path, {'oid': ['mondo']})
+    assert RunCheckpoint(work_dir, data_path, {'oid': ['mondo', 'hp']}, resume=True).path != checkpoint.path
+    data_path.write_text(data_path.read_text() + 'study_1,condition,new term,new term\n')
+    assert RunCheckpoint(work_dir, data_path, {'oid': ['mondo']}, resume=True).path != checkpoint.path
+
+    checkpoint.clear()
+    assert not checkpoint.path.exists()
+
+
+def _stream(data_path, output_path, lexicon_dir, checkpoint):
+    metrics = RunMetrics()
+    _stream_search(('mondo',), data_path, output_path, 120, dict(cache_path=None, lexicon_dir=lexicon_dir),
+                   metrics, checkpoint)
+    return pd.read_csv(output_path, dtype=str), metrics
+
+
+def test_resumed_stream_run_reuses_chunks_without_opening_the_ontology(ontology_db, data_path, tmp_path):
+    db_path, _ = ontology_db
+    lexicon_dir = tmp_path / 'lexicons'
+    build_lexicon_artifact('mondo', str(db_path), artifact_path(lexicon_dir, 'mondo'), VERSION)
+    work_dir = tmp_path / 'work'
+
+    output_df, _ = _stream(data_path, tmp_path / 'first.csv', lexicon_dir, RunCheckpoint(work_dir, data_path, {}))
+    resumed_df, metrics = _stream(data_path, tmp_path / 'resumed.csv', lexicon_dir,
+                                  RunCheckpoint(work_dir, data_path, {}, resume=True))
+    pd.testing.assert_frame_equal(resumed_df, output_df)
+    assert metrics.counters['checkpoint.chunks_resumed'] == 5
+    assert 'mondo.fetch' not in metrics.stages
+    assert metrics.versions == {'mondo': VERSION}
+
+    # The chunks still to search get the results of another release than the saved ones
+    checkpoint = RunCheckpoint(work_dir, data_path, {}, resume=True)
+    sorted(checkpoint.path.glob('*.pkl'))[-1].unlink()
+    build_lexicon_artifact('mondo', str(db_path), artifact_path(lexicon_dir, 'mondo'), VERSION.replace('2024', '2025'))
+    with pytest.raises(click.ClickException, match='mondo changed'):
+        _stream(data_path, tmp_path / 'mixed.csv', lexicon_dir, checkpoint)
@@ -0,0 +1,45 @@
+import pytest
+
+from harmonize import open_readonly_adapter, search_ontology
+from incremental import row_ids
+from lexicon import Lexicon
+from match_cache import MatchCache
+from run_metrics import RunMetrics
+
+VERSION = 'http://purl.obolibrary.org/obo/mondo/releases/2024-01-01/mondo.owl'
+
+
+@pytest.fixture
+def search_df(data_df):
+    df = data_df.copy()
+    df['UUID'] = row_ids(df)
+    return df
+
+
+def _results(ontology_db, df, engine, cache=None, metrics=None):
+    db_path, _ = ontology_db
+    lexicon = Lexicon.from_semsql('mondo', str(db_path)) if engine == 'lexicon' else None
+    results_df = search_ontology('mondo', open_readonly_adapter(str(db_path)), df, lexicon=lexicon, cache=cache,
+                                 ontology_version=VERSION, metrics=metrics)
+    # The hits of a term are joined in the order each engine finds them
+    return {row['UUID']: (row['mondo_result_match_type'], sorted(row['mondo_result_curie'].split(', ')))
+            for _, row in results_df.iterrows()}
+
+
+def test_lexicon_and_oak_engines_find_the_same_matches(ontology_db, search_df):
+    lexicon_results = _results(ontology_db, search_df, 'lexicon')
+    assert lexicon_results
+    assert lexicon_results == _results(ontology_db, search_df, 'oak')
+
+
+def test_engines_do_not_share_cached_results(ontology_db, search_df, tmp_path):
+    cache = MatchCache(tmp_path / 'match_cache.db')
+    _results(ontology_db, search_df, 'lexicon', cache)
+
+    metrics = RunMetrics()
+    _results(ontology_db, search_df, 'oak', cache, metrics)
+    assert metrics.counters['mondo.EXACT_LABEL.cache_hits'] == 0
+
+    metrics = RunMetrics()
+    _results(ontology_db, search_df, 'lexicon', cache, metrics)
+    assert metrics.counters['mondo.EXACT_LABEL.cache_hits'] > 0
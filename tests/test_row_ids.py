@@ -0,0 +1,64 @@
+from collections import Counter
+
+import pandas as pd
+
+from data_io import iter_input_chunks, open_chunk_writer, read_input
+from incremental import PreviousRun, row_ids, write_manifest
+
+
+def _numeric_study_df(data_df: pd.DataFrame) -> pd.DataFrame:
+    # Study IDs empty in the first rows only: pandas reads the whole column as floats, openpyxl reads the
+    # chunks without an empty cell as integers
+    df = data_df.copy()
+    df['study'] = pd.array([None if number < 3 else number % 7 for number in range(len(df))], dtype='Int64')
+    return df
+
+
+def _streamed_ids(data_path, chunk_rows):
+    seen = Counter()
+    return [row_id for chunk_df in iter_input_chunks(data_path, chunk_rows) for row_id in row_ids(chunk_df, seen)]
+
+
+def test_identical_rows_are_numbered():
+    df = pd.DataFrame({'study': ['s1', 's1', 's2'], 'source_column': 'c', 'source_column_value': ['a', 'a', 'a'],
+                       'conditionMeasureSourceText': ['a', 'a', 'a']})
+    ids = row_ids(df).tolist()
+    assert ids[1] == f'{ids[0]}-1'
+    assert len(set(ids)) == 3
+
+
+def test_identical_rows_are_numbered_across_chunks(data_df, tmp_path):
+    data_path = tmp_path / 'data.csv'
+    data_df.to_csv(data_path, index=False)
+    streamed_ids = _streamed_ids(data_path, 37)
+    assert len(set(streamed_ids)) == len(data_df)
+    assert streamed_ids == row_ids(read_input(data_path)).tolist()
+
+
+def test_excel_ids_do_not_depend_on_the_reader(data_df, tmp_path):
+    df = _numeric_study_df(data_df)
+    xlsx_path = tmp_path / 'data.xlsx'
+    csv_path = tmp_path / 'data.csv'
+    df.to_excel(xlsx_path, sheet_name='Sheet1', index=False)
+    df.to_csv(csv_path, index=False)
+
+    whole_ids = row_ids(read_input(xlsx_path)).tolist()
+    assert _streamed_ids(xlsx_path, 50) == whole_ids
+    assert row_ids(read_input(csv_path)).tolist() == whole_ids
+
+
+def test_streamed_output_is_a_usable_previous_output(data_df, tmp_path):
+    data_path = tmp_path / 'data.csv'
+    data_df.to_csv(data_path, index=False)
+    output_path = tmp_path / 'output.xlsx'
+    writer = open_chunk_writer(output_path)
+    seen = Counter()
+    for chunk_df in iter_input_chunks(data_path, 37):
+        chunk_df['UUID'] = row_ids(chunk_df, seen)
+        writer.write(chunk_df)
+    writer.close()
+    write_manifest(output_path, {}, {})
+
+    previous = PreviousRun(output_path)
+    assert not previous.df['UUID'].duplicated().any()
+    assert previous.row_ids == set(row_ids(read_input(data_path)))
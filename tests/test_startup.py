@@ -0,0 +1,12 @@
+from startup import HEAVY_MODULES, IMPORT_BUDGET_MS, measure_imports
+
+
+def test_cli_help_does_not_import_search_dependencies():
+    _, heavy = measure_imports(['--help'])
+    assert heavy == [], f"harmonize.py --help imports {', '.join(heavy)}, of {', '.join(HEAVY_MODULES)}"
+
+
+def test_cli_imports_within_budget():
+    # The best of a few runs, so that a busy machine does not fail the budget
+    import_ms = min(sum(measure_imports(['--help'])[0].values()) / 1000 for _ in range(3))
+    assert import_ms <= IMPORT_BUDGET_MS